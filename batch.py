@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+from disk_cache import DEFAULT_PATH, DiskCache
+from instrument import aggregate
+from menu import (
+    CUBATURE_METHODS, ODE_METHODS, cubature_expression, integrate_expression, parse_number, print_report,
+    solve_ode_expression, stream_ode_expression,
+)
+
+JOB_FIELDS = ["expression", "a", "b", "method", "n", "y0"]
+RESULT_FIELDS = JOB_FIELDS + ["approx", "error", "steps", "evaluations", "status", "seconds"]
+
+
+def read_jobs(path):
+    if path == '-':
+        stream = sys.stdin
+        extension = '.jsonl'
+    else:
+        stream = open(path, newline='')
+        extension = os.path.splitext(path)[1].lower()
+
+    with stream:
+        if extension == '.csv':
+            yield from csv.DictReader(stream)
+        elif extension == '.json':
+            yield from json.load(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_job(job):
+    n = job.get('n')
+    y0 = job.get('y0')
+    if isinstance(y0, list):
+        y0 = [parse_number(value) for value in y0]
+    elif y0 not in [None, '']:
+        y0 = parse_number(y0)
+    else:
+        y0 = None
+
+    expression = job['expression']
+    box = isinstance(job['a'], list)
+    return {
+        'expression': [str(e) for e in expression] if isinstance(expression, list) else str(expression),
+        'a': [parse_number(value) for value in job['a']] if box else parse_number(job['a']),
+        'b': [parse_number(value) for value in job['b']] if box else parse_number(job['b']),
+        'method': job.get('method') or ('sparse_grid' if box else 'composite_simpsom'),
+        'n': int(n) if n not in [None, ''] else None,
+        'y0': y0,
+        'trajectory': job.get('trajectory') or None,
+        'stride': int(job.get('stride') or 1),
+    }
+
+
+def run_job(job, cache=None, profile=False):
+    start = time.perf_counter()
+    try:
+        job = parse_job(job)
+        if job['trajectory']:
+            result = stream_ode_expression(job['expression'], job['method'], job['a'], job['b'], job['y0'],
+                                           job['n'], job['trajectory'], job['stride'], profile=profile)
+        elif job['method'] in ODE_METHODS:
+            result = solve_ode_expression(job['expression'], job['method'], job['a'], job['b'], job['y0'], job['n'],
+                                          profile)
+        elif job['method'] in CUBATURE_METHODS:
+            result = cubature_expression(job['expression'], job['method'], job['a'], job['b'], job['n'], profile)
+        else:
+            result = integrate_expression(job['expression'], job['method'], job['a'], job['b'], job['n'], cache,
+                                          profile)
+        result = dict(job, **result, status='ok')
+    except Exception as e:
+        result = dict({field: job.get(field) for field in JOB_FIELDS}, approx=None, error=None, status=f"error: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+worker_cache = None
+worker_profile = False
+
+
+def init_worker(cache_path, profile=False):
+    global worker_cache, worker_profile
+    worker_cache = DiskCache(cache_path) if cache_path else None
+    worker_profile = profile
+
+
+def run_worker_job(job):
+    return run_job(job, worker_cache, worker_profile)
+
+
+def run_parallel(jobs, workers=None, chunk_size=16, cache_path=None, profile=False):
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(cache_path, profile)) as pool:
+        yield from pool.imap(run_worker_job, jobs, chunksize=chunk_size)
+
+
+def run_serial(jobs, cache_path=None, profile=False):
+    cache = DiskCache(cache_path) if cache_path else None
+    for job in jobs:
+        yield run_job(job, cache, profile)
+
+
+def plot_job(result, directory, index):
+    # There is no finite window that shows an integral over an infinite interval
+    if math.isinf(result['a']) or math.isinf(result['b']):
+        return
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from menu import cached_integrand
+
+    _, f = cached_integrand(result['expression'])
+    x = np.linspace(result['a'], result['b'], 512)
+    y = np.broadcast_to(f(x), x.shape)
+
+    figure, axes = plt.subplots()
+    axes.plot(x, y, label="f(x)")
+    axes.fill_between(x, y, alpha=0.3)
+    axes.axhline(color='black', linewidth=0.5)
+    axes.set_title(f"{result['expression']} ({result['method']})")
+    axes.set_xlabel("x")
+    axes.grid(True, which='both')
+    axes.legend()
+    figure.savefig(os.path.join(directory, f"job-{index}.png"))
+    plt.close(figure)
+
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, result):
+        self.stream.write(json.dumps(result) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, result):
+        self.writer.writerow(result)
+        self.stream.flush()
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Integrate or solve a file of jobs without menus or plots.")
+    parser.add_argument('jobs', help="JSON, JSON lines or CSV file of (expression, a, b, method, n[, y0]) jobs, "
+                                     "or - for stdin; a and b may be lists of x, y[, z] limits")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='jsonl', help="output format")
+    parser.add_argument('--output', default='-', help="output file, or - for stdout")
+    parser.add_argument('--cache', default=DEFAULT_PATH, help="on-disk cache file")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the on-disk cache")
+    parser.add_argument('--plot-dir', help="write a PNG of each integrand to this directory")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (0 uses every CPU, 1 runs in this process)")
+    parser.add_argument('--chunk-size', type=int, default=16, help="jobs sent to a worker at a time")
+    parser.add_argument('--profile', action='store_true',
+                        help="add a per-stage timing and evaluation report to each result and print the batch "
+                             "total to stderr")
+    args = parser.parse_args(argv)
+
+    cache_path = None if args.no_cache else args.cache
+    if args.workers == 1:
+        results = run_serial(read_jobs(args.jobs), cache_path, args.profile)
+    else:
+        results = run_parallel(read_jobs(args.jobs), args.workers or None, args.chunk_size, cache_path, args.profile)
+
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    writer = WRITERS[args.format](stream)
+
+    if args.plot_dir:
+        os.makedirs(args.plot_dir, exist_ok=True)
+
+    failures = 0
+    reports = []
+    for index, result in enumerate(results):
+        writer.write(result)
+        if 'report' in result:
+            reports.append(result['report'])
+        if result['status'] != 'ok':
+            failures += 1
+        elif args.plot_dir and result['method'] not in ODE_METHODS and result['method'] not in CUBATURE_METHODS:
+            plot_job(result, args.plot_dir, index)
+
+    if stream is not sys.stdout:
+        stream.close()
+    if args.profile:
+        print_report(aggregate(reports), sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from kernels import (
+    adaptive_quadrature, bdf_method, clenshaw_curtis, closed_newton_four, composite_simpsom, composite_trapezoidal,
+    double_exponential, dormand_prince, euler_method, gauss_kronrod, gauss_legendre, open_newton_one, open_newton_three,
+    open_newton_two, open_newton_zero, quasi_monte_carlo, rk4_method, romberg, simpson, simpson_three_eighths,
+    sparse_grid, tensor_product, trapezoidal,
+)
+from menu import results_sink
+
+STARTUP_MODULES = ['kernels', 'disk_cache', 'menu', 'batch', 'sympy', 'matplotlib.pyplot', 'prettytable']
+
+
+def time_command(code, repeat):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=directory, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def loaded_modules(module):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=directory, check=True,
+                            capture_output=True, text=True).stdout.split()
+    return sorted({name.split('.')[0] for name in output} & {'sympy', 'matplotlib', 'prettytable'})
+
+
+def startup_benchmark(modules=STARTUP_MODULES, repeat=5):
+    interpreter = time_command('pass', repeat)
+    results = []
+    for module in modules:
+        try:
+            seconds = time_command(f"import {module}", repeat)
+        except subprocess.CalledProcessError:
+            continue
+        results.append({
+            'module': module,
+            'seconds': seconds - interpreter,
+            'heavy': loaded_modules(module),
+        })
+    return {'python': sys.version.split()[0], 'interpreter': interpreter, 'startup': results}
+
+
+# Numerical benchmarks
+
+INTEGRANDS = {
+    'polynomial': (lambda x: x ** 5 - 2 * x ** 2, 0.0, 1.0, -0.5),
+    'oscillatory': (lambda x: np.cos(20 * x), 0.0, 1.0, math.sin(20) / 20),
+    'peaked': (lambda x: 1 / (1 + 100 * (x - 0.5) ** 2), 0.0, 1.0, math.atan(5) / 5),
+    'singular_endpoint': (lambda x: np.sqrt(x), 0.0, 1.0, 2 / 3),
+}
+
+QUADRATURE_RULES = {
+    'trapezoidal': lambda a, b, f, n: trapezoidal(a, b, f),
+    'simpson': lambda a, b, f, n: simpson(a, b, f),
+    'simpson_three_eighths': lambda a, b, f, n: simpson_three_eighths(a, b, f),
+    'closed_newton_four': lambda a, b, f, n: closed_newton_four(a, b, f),
+    'open_newton_zero': lambda a, b, f, n: open_newton_zero(a, b, f),
+    'open_newton_one': lambda a, b, f, n: open_newton_one(a, b, f),
+    'open_newton_two': lambda a, b, f, n: open_newton_two(a, b, f),
+    'open_newton_three': lambda a, b, f, n: open_newton_three(a, b, f),
+    'gauss_legendre': lambda a, b, f, n: gauss_legendre(a, b, f),
+    'gauss_kronrod': lambda a, b, f, n: gauss_kronrod(a, b, f)[0],
+    'clenshaw_curtis': lambda a, b, f, n: clenshaw_curtis(a, b, f, n=n)[0],
+    'adaptive_simpson': lambda a, b, f, n: adaptive_quadrature(a, b, f)[0],
+    'romberg': lambda a, b, f, n: romberg(a, b, f)[0],
+    'double_exponential': lambda a, b, f, n: double_exponential(a, b, f)[0],
+    'composite_trapezoidal': lambda a, b, f, n: composite_trapezoidal(a, b, f, n),
+    'composite_simpsom': lambda a, b, f, n: composite_simpsom(a, b, f, n + n % 2),
+}
+
+CUBATURES = {
+    'exponential_2d': (lambda x, y: np.exp(x + y), [0.0, 0.0], [1.0, 1.0], (math.e - 1) ** 2),
+    'gaussian_3d': (lambda x, y, z: np.exp(-(x ** 2 + y ** 2 + z ** 2)), [0.0, 0.0, 0.0], [1.0, 1.0, 1.0],
+                    (math.sqrt(math.pi) / 2 * math.erf(1)) ** 3),
+}
+
+CUBATURE_RULES = {
+    'tensor_trapezoidal': lambda lower, upper, f, n: tensor_product(lower, upper, f, n, 'trapezoidal')[0],
+    'tensor_simpson': lambda lower, upper, f, n: tensor_product(lower, upper, f, n + n % 2, 'simpson')[0],
+    'sparse_grid': lambda lower, upper, f, n: sparse_grid(lower, upper, f, n)[0],
+    'quasi_monte_carlo': lambda lower, upper, f, n: quasi_monte_carlo(lower, upper, f, 0, 2 ** n, seed=0)[0],
+}
+
+ODES = {
+    'decay': (lambda t, y: -y, lambda t, y: -1.0, 0.0, 2.0, 1.0, math.exp(-2)),
+    'logistic': (lambda t, y: y * (1 - y), lambda t, y: 1 - 2 * y, 0.0, 5.0, 0.1, 1 / (1 + 9 * math.exp(-5))),
+    'stiff': (lambda t, y: -50 * (y - np.cos(t)), lambda t, y: -50.0, 0.0, 1.0, 0.0,
+              (2500 * math.cos(1) + 50 * math.sin(1) - 2500 * math.exp(-50)) / 2501),
+}
+
+ODE_SOLVERS = {
+    'euler': lambda f, jac, a, b, y0, n: euler_method(f, a, b, y0, n)[1],
+    'rk4': lambda f, jac, a, b, y0, n: rk4_method(f, a, b, y0, n)[1],
+    'dormand_prince': lambda f, jac, a, b, y0, n: dormand_prince(f, a, b, y0, h=(b - a) / n)[1],
+    'backward_euler': lambda f, jac, a, b, y0, n: bdf_method(f, jac, a, b, y0, n, order=1)[1],
+    'bdf': lambda f, jac, a, b, y0, n: bdf_method(f, jac, a, b, y0, n)[1],
+}
+
+QUADRATURE_N = [16, 256, 4096, 65536, 2 ** 20]
+CUBATURE_N = {'tensor_trapezoidal': [16, 64, 256], 'tensor_simpson': [16, 64, 256], 'sparse_grid': [4, 6, 8],
+              'quasi_monte_carlo': [13, 17, 21]}
+ODE_N = [10, 100, 1000, 10000]
+SINGLE_PANEL = {'trapezoidal', 'simpson', 'simpson_three_eighths', 'closed_newton_four', 'open_newton_zero',
+                'open_newton_one', 'open_newton_two', 'open_newton_three', 'gauss_legendre', 'gauss_kronrod',
+                'adaptive_simpson', 'romberg', 'double_exponential'}
+
+
+def counted(f, points):
+    counter = [0]
+
+    def g(*args):
+        counter[0] += np.size(args[0]) if points else 1
+        return f(*args)
+
+    return g, counter
+
+
+def measure(run, repeat):
+    seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    value = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, seconds, peak
+
+
+def quadrature_benchmark(methods, problems, ns, repeat):
+    results = []
+    for problem in problems:
+        f, a, b, exact = INTEGRANDS[problem]
+        for method in methods:
+            for n in ([None] if method in SINGLE_PANEL else ns):
+                g, counter = counted(f, True)
+                rule = QUADRATURE_RULES[method]
+                with np.errstate(all='ignore'):
+                    approx, seconds, peak = measure(lambda: rule(a, b, g, n), repeat)
+                results.append({
+                    'kind': 'quadrature', 'problem': problem, 'method': method, 'n': n,
+                    'seconds': seconds, 'evaluations': counter[0] // (repeat + 1),
+                    'error': abs(float(approx) - exact), 'peak_bytes': peak,
+                })
+    return results
+
+
+def cubature_benchmark(methods, problems, ns, repeat):
+    results = []
+    for problem in problems:
+        f, lower, upper, exact = CUBATURES[problem]
+        for method in methods:
+            for n in ns or CUBATURE_N[method]:
+                g, counter = counted(f, True)
+                rule = CUBATURE_RULES[method]
+                with np.errstate(all='ignore'):
+                    approx, seconds, peak = measure(lambda: rule(lower, upper, g, n), repeat)
+                results.append({
+                    'kind': 'cubature', 'problem': problem, 'method': method, 'n': n,
+                    'seconds': seconds, 'evaluations': counter[0] // (repeat + 1),
+                    'error': abs(float(approx) - exact), 'peak_bytes': peak,
+                })
+    return results
+
+
+def ode_benchmark(methods, problems, ns, repeat):
+    results = []
+    for problem in problems:
+        f, jac, a, b, y0, exact = ODES[problem]
+        for method in methods:
+            for n in ns:
+                g, counter = counted(f, False)
+                solver = ODE_SOLVERS[method]
+                with np.errstate(all='ignore'):
+                    y_values, seconds, peak = measure(lambda: solver(g, jac, a, b, y0, n), repeat)
+                results.append({
+                    'kind': 'ode', 'problem': problem, 'method': method, 'n': n,
+                    'seconds': seconds, 'evaluations': counter[0] // (repeat + 1),
+                    'error': abs(float(np.ravel(y_values[-1])[0]) - exact), 'peak_bytes': peak,
+                })
+    return results
+
+
+def result_key(result):
+    return result['kind'], result['problem'], result['method'], result['n']
+
+
+def compare_results(old, new, time_threshold=0.25, error_threshold=0.1):
+    baseline = {result_key(result): result for result in old['results']}
+    regressions = []
+    for result in new['results']:
+        before = baseline.get(result_key(result))
+        if before is None:
+            continue
+        reasons = []
+        if result['seconds'] > before['seconds'] * (1 + time_threshold) + 1e-4:
+            reasons.append(f"time {before['seconds']:.3g}s -> {result['seconds']:.3g}s")
+        if result['evaluations'] > before['evaluations']:
+            reasons.append(f"evaluations {before['evaluations']} -> {result['evaluations']}")
+        if not result['error'] <= max(before['error'] * (1 + error_threshold), before['error'] + 1e-15):
+            reasons.append(f"error {before['error']:.3g} -> {result['error']:.3g}")
+        if result['peak_bytes'] > before['peak_bytes'] * 1.1 + 4096:
+            reasons.append(f"peak memory {before['peak_bytes']} -> {result['peak_bytes']} bytes")
+        if reasons:
+            regressions.append((result, reasons))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure start-up and numerical performance.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    startup = commands.add_parser('startup', help="time importing each module in a fresh interpreter")
+    startup.add_argument('modules', nargs='*', default=STARTUP_MODULES, help="modules to import")
+    startup.add_argument('--repeat', type=int, default=5, help="runs per module; the median is reported")
+    startup.add_argument('--output', help="also write the results to this JSON file")
+
+    run = commands.add_parser('run', help="time every quadrature rule, cubature rule and ODE solver on a fixed "
+                                          "corpus")
+    run.add_argument('--methods', nargs='+', default=list(QUADRATURE_RULES) + list(CUBATURE_RULES) + list(ODE_SOLVERS),
+                     help="quadrature rules, cubature rules and ODE solvers to run")
+    run.add_argument('--problems', nargs='+', default=list(INTEGRANDS) + list(CUBATURES) + list(ODES),
+                     help="integrands, box integrands and ODEs to run")
+    run.add_argument('--n', type=int, nargs='+', help="subintervals or steps (default depends on the kind)")
+    run.add_argument('--cubature-n', type=int, nargs='+',
+                     help="subintervals per axis, sparse grid levels or log2 of Sobol points for the cubature rules "
+                          "(default depends on the method)")
+    run.add_argument('--repeat', type=int, default=5, help="timed runs per case; the fastest is reported")
+    run.add_argument('--output', help="write the results to this JSON file")
+
+    compare = commands.add_parser('compare', help="flag regressions between two saved runs")
+    compare.add_argument('old', help="baseline results file")
+    compare.add_argument('new', help="results file to check")
+    compare.add_argument('--time-threshold', type=float, default=0.25, help="allowed relative slowdown")
+    compare.add_argument('--error-threshold', type=float, default=0.1, help="allowed relative error increase")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'startup':
+        report = startup_benchmark(args.modules, args.repeat)
+        table = results_sink(["Module", "Import (ms)", "Heavy modules loaded"])
+        for result in report['startup']:
+            table.add_row([result['module'], round(1000 * result['seconds'], 1), ', '.join(result['heavy']) or '-'])
+        table.close()
+
+    elif args.command == 'run':
+        results = quadrature_benchmark([m for m in args.methods if m in QUADRATURE_RULES],
+                                       [p for p in args.problems if p in INTEGRANDS],
+                                       args.n or QUADRATURE_N, args.repeat)
+        results += cubature_benchmark([m for m in args.methods if m in CUBATURE_RULES],
+                                      [p for p in args.problems if p in CUBATURES], args.cubature_n, args.repeat)
+        results += ode_benchmark([m for m in args.methods if m in ODE_SOLVERS],
+                                 [p for p in args.problems if p in ODES],
+                                 args.n or ODE_N, args.repeat)
+        report = {'python': sys.version.split()[0], 'numpy': np.__version__, 'results': results}
+        table = results_sink(["Problem", "Method", "n", "Time (ms)", "Evaluations", "Error", "Peak (KiB)"])
+        for result in results:
+            table.add_row([result['problem'], result['method'], result['n'], round(1000 * result['seconds'], 3),
+                           result['evaluations'], f"{result['error']:.3e}", round(result['peak_bytes'] / 1024, 1)])
+        table.close()
+
+    else:
+        with open(args.old) as stream:
+            old = json.load(stream)
+        with open(args.new) as stream:
+            new = json.load(stream)
+        regressions = compare_results(old, new, args.time_threshold, args.error_threshold)
+        table = results_sink(["Problem", "Method", "n", "Regression"])
+        for result, reasons in regressions:
+            table.add_row([result['problem'], result['method'], result['n'], '; '.join(reasons)])
+        table.close()
+        print(f"{len(regressions)} regression(s) in {len(new['results'])} cases")
+        return 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
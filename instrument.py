@@ -0,0 +1,90 @@
+import collections
+import contextlib
+import functools
+import time
+
+import numpy as np
+
+active = None
+
+
+# Stage times exclude the stages nested inside them, so they add up to at most the total
+class Report:
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.evaluations = collections.defaultdict(int)
+        self.nested = []
+
+    def enter(self):
+        self.nested.append(0.0)
+        return time.perf_counter()
+
+    def leave(self, name, start):
+        elapsed = time.perf_counter() - start
+        self.seconds[name] += elapsed - self.nested.pop()
+        if self.nested:
+            self.nested[-1] += elapsed
+        return elapsed
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = self.enter()
+        try:
+            yield
+        finally:
+            self.leave(name, start)
+
+    def counted(self, name, f):
+        @functools.wraps(f)
+        def g(*args, **kwargs):
+            start = self.enter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.leave(name, start)
+                self.evaluations[name] += np.size(args[0]) if args else 1
+
+        return g
+
+    def merge(self, report):
+        for name, seconds in report['seconds'].items():
+            self.seconds[name] += seconds
+        for name, evaluations in report['evaluations'].items():
+            self.evaluations[name] += evaluations
+        return self
+
+    def as_dict(self):
+        return {'seconds': dict(self.seconds), 'evaluations': dict(self.evaluations)}
+
+
+@contextlib.contextmanager
+def profiling(report=None):
+    global active
+    previous = active
+    active = Report() if report is None else report
+    start = active.enter()
+    try:
+        yield active
+    finally:
+        # The total covers the whole run, nested stages included
+        active.seconds['total'] += active.leave('other', start)
+        active = previous
+
+
+def stage(name):
+    if active is None:
+        return contextlib.nullcontext()
+    return active.stage(name)
+
+
+def counted(name, f):
+    if active is None:
+        return f
+    return active.counted(name, f)
+
+
+def aggregate(reports):
+    total = Report()
+    for report in reports:
+        total.merge(report)
+    return total.as_dict()
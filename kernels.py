@@ -0,0 +1,1449 @@
+import functools
+import heapq
+import math
+
+import numpy as np
+
+
+# Derivative bounds
+
+def interval_round(lo, hi):
+    return np.nextafter(lo, -np.inf), np.nextafter(hi, np.inf)
+
+
+def interval_power(lo, hi, exponent):
+    if exponent.is_Integer:
+        k = int(exponent)
+        if k == 0:
+            return np.ones_like(lo), np.ones_like(hi)
+        if k < 0:
+            lo, hi = interval_power(lo, hi, -exponent)
+            contains_zero = (lo <= 0) & (hi >= 0)
+            with np.errstate(divide='ignore'):
+                new_lo = np.where(contains_zero, -np.inf, 1 / hi)
+                new_hi = np.where(contains_zero, np.inf, 1 / lo)
+            return new_lo, new_hi
+        if k % 2 == 1:
+            return lo ** k, hi ** k
+        low = np.where((lo <= 0) & (hi >= 0), 0.0, np.minimum(np.abs(lo), np.abs(hi)) ** k)
+        return low, np.maximum(np.abs(lo), np.abs(hi)) ** k
+
+    p = float(exponent)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lo = np.where(hi < 0, np.nan, np.maximum(lo, 0.0))
+        if p > 0:
+            return lo ** p, hi ** p
+        return hi ** p, lo ** p
+
+
+def interval_sin(lo, hi):
+    new_lo = np.minimum(np.sin(lo), np.sin(hi))
+    new_hi = np.maximum(np.sin(lo), np.sin(hi))
+    peak = np.pi / 2 + 2 * np.pi * np.ceil((lo - np.pi / 2) / (2 * np.pi))
+    trough = -np.pi / 2 + 2 * np.pi * np.ceil((lo + np.pi / 2) / (2 * np.pi))
+    new_hi = np.where(peak <= hi, 1.0, new_hi)
+    new_lo = np.where(trough <= hi, -1.0, new_lo)
+    return new_lo, new_hi
+
+
+def interval_evaluate(expr, symbol, lo, hi):
+    if expr == symbol:
+        return lo, hi
+    if expr.is_number:
+        value = float(expr)
+        return interval_round(np.full_like(lo, value), np.full_like(hi, value))
+
+    args = [interval_evaluate(arg, symbol, lo, hi) for arg in expr.args]
+
+    if expr.is_Add:
+        new_lo, new_hi = args[0]
+        for arg_lo, arg_hi in args[1:]:
+            new_lo, new_hi = new_lo + arg_lo, new_hi + arg_hi
+    elif expr.is_Mul:
+        new_lo, new_hi = args[0]
+        for arg_lo, arg_hi in args[1:]:
+            products = [new_lo * arg_lo, new_lo * arg_hi, new_hi * arg_lo, new_hi * arg_hi]
+            new_lo, new_hi = np.minimum.reduce(products), np.maximum.reduce(products)
+    elif expr.is_Pow:
+        if not expr.exp.is_number:
+            base_lo, base_hi = args[0]
+            if not (expr.base.is_number and float(expr.base) > 0):
+                raise NotImplementedError(expr)
+            exp_lo, exp_hi = args[1]
+            log_base = np.log(float(expr.base))
+            new_lo, new_hi = np.exp(exp_lo * log_base), np.exp(exp_hi * log_base)
+            if log_base < 0:
+                new_lo, new_hi = new_hi, new_lo
+        else:
+            new_lo, new_hi = interval_power(*args[0], expr.exp)
+    elif len(args) == 1:
+        arg_lo, arg_hi = args[0]
+        name = expr.func.__name__
+        if name in ['exp', 'log', 'atan', 'asinh', 'sinh', 'tanh', 'erf']:
+            function = {'exp': np.exp, 'log': np.log, 'atan': np.arctan, 'asinh': np.arcsinh,
+                        'sinh': np.sinh, 'tanh': np.tanh, 'erf': np.vectorize(math.erf, otypes=[float])}[name]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                new_lo, new_hi = function(arg_lo), function(arg_hi)
+        elif name == 'sin':
+            new_lo, new_hi = interval_sin(arg_lo, arg_hi)
+        elif name == 'cos':
+            new_lo, new_hi = interval_sin(arg_lo + np.pi / 2, arg_hi + np.pi / 2)
+        elif name in ['Abs', 'cosh']:
+            function = np.abs if name == 'Abs' else np.cosh
+            contains_zero = (arg_lo <= 0) & (arg_hi >= 0)
+            new_lo = np.where(contains_zero, function(0.0), np.minimum(function(arg_lo), function(arg_hi)))
+            new_hi = np.maximum(function(arg_lo), function(arg_hi))
+        else:
+            raise NotImplementedError(expr)
+    else:
+        raise NotImplementedError(expr)
+
+    return interval_round(new_lo, new_hi)
+
+
+def interval_bound(expr, symbol, a, b, pieces=256):
+    edges = np.linspace(min(a, b), max(a, b), pieces + 1)
+    lo, hi = interval_evaluate(expr, symbol, edges[:-1], edges[1:])
+    bound = np.max(np.maximum(np.abs(lo), np.abs(hi)))
+    return float(bound) if np.isfinite(bound) else float('inf')
+
+
+def golden_section_max(g, lo, hi, iterations=40):
+    ratio = (np.sqrt(5) - 1) / 2
+    c = hi - ratio * (hi - lo)
+    d = lo + ratio * (hi - lo)
+    g_c = g(c)
+    g_d = g(d)
+
+    for _ in range(iterations):
+        left = g_c >= g_d
+        hi = np.where(left, d, hi)
+        lo = np.where(left, lo, c)
+        x = np.where(left, hi - ratio * (hi - lo), lo + ratio * (hi - lo))
+        g_x = g(x)
+        c, d = np.where(left, x, d), np.where(left, c, x)
+        g_c, g_d = np.where(left, g_x, g_d), np.where(left, g_c, g_x)
+
+    return np.maximum(g_c, g_d)
+
+
+@functools.lru_cache(maxsize=256)
+def cached_derivative_bound(f_prime, a, b, num_points, method):
+    if method == 'interval':
+        expr = getattr(f_prime, 'expr', None)
+        if expr is not None:
+            try:
+                return interval_bound(expr, f_prime.symbol, a, b)
+            except (NotImplementedError, TypeError):
+                pass
+        method = 'refine'
+
+    x_values = np.linspace(a, b, num_points)
+    g = lambda x: np.abs(evaluate_nodes(f_prime, x))
+    derivative_values = g(x_values)
+    bound = float(np.max(derivative_values))
+
+    if method == 'refine' and num_points > 2:
+        padded = np.concatenate([[-np.inf], derivative_values, [-np.inf]])
+        peaks = np.flatnonzero((padded[1:-1] >= padded[:-2]) & (padded[1:-1] >= padded[2:]))
+        peaks = peaks[np.argsort(derivative_values[peaks])[::-1][:3]]
+        lo = x_values[np.maximum(peaks - 1, 0)]
+        hi = x_values[np.minimum(peaks + 1, num_points - 1)]
+        bound = max(bound, float(np.max(golden_section_max(g, np.minimum(lo, hi), np.maximum(lo, hi)))))
+
+    return bound
+
+
+def derivative_bound(f_prime, a, b, num_points=100, method='refine'):
+    if method not in ['sample', 'refine', 'interval']:
+        print("method must be 'sample', 'refine' or 'interval'")
+        return None
+    return cached_derivative_bound(f_prime, float(a), float(b), num_points, method)
+
+
+def trapezoidal(x_0, x_1, f):
+    h = x_1 - x_0
+    approx = (h / 2) * (f(x_0) + f(x_1))
+    return approx
+
+
+def error_trapezoidal(x_0, x_1, f_2_prime, num_points=100, method='refine'):
+    h = x_1 - x_0
+    max_second_derivative = derivative_bound(f_2_prime, x_0, x_1, num_points, method)
+    error = abs((h ** 3 / 12) * max_second_derivative)
+    return error
+
+
+def simpson(x_0, x_2, f):
+    x_1 = (x_0 + x_2) / 2
+    h = (x_2 - x_0) / 2
+    approx = (h / 3) * (f(x_0) + 4 * f(x_1) + f(x_2))
+    return approx
+
+
+def error_simpson(x_0, x_2, f_4_prime, num_points=100, method='refine'):
+    h = (x_2 - x_0) / 2
+    max_fourth_derivative = derivative_bound(f_4_prime, x_0, x_2, num_points, method)
+    error = abs((h ** 5 / 90) * max_fourth_derivative)
+    return error
+
+
+def simpson_three_eighths(x_0, x_3, f):
+    h = (x_3 - x_0) / 3
+    x_1 = x_0 + h
+    x_2 = x_0 + 2 * h
+    approx = (h * 3 / 8) * (f(x_0) + 3 * f(x_1) + 3 * f(x_2) + f(x_3))
+    return approx
+
+
+def error_simpson_three_eighths(x_0, x_3, f_4_prime, num_points=100, method='refine'):
+    h = (x_3 - x_0) / 3
+    max_fourth_derivative = derivative_bound(f_4_prime, x_0, x_3, num_points, method)
+    error = abs((h ** 5 * (3 / 80)) * max_fourth_derivative)
+    return error
+
+
+def closed_newton_four(x_0, x_4, f):
+    h = (x_4 - x_0) / 4
+    x_1 = x_0 + h
+    x_2 = x_0 + 2 * h
+    x_3 = x_0 + 3 * h
+    approx = (h * 2 / 45) * (7 * f(x_0) + 32 * f(x_1) + 12 * f(x_2) + + 32 * f(x_3) + 7 * f(x_4))
+    return approx
+
+
+def error_closed_newton_four(x_0, x_4, f_6_prime, num_points=100, method='refine'):
+    h = (x_4 - x_0) / 4
+    max_sixth_derivative = derivative_bound(f_6_prime, x_0, x_4, num_points, method)
+    error = abs((h ** 7 * (8 / 945)) * max_sixth_derivative)
+    return error
+
+
+# Open methods
+
+def open_newton_zero(x__1, x_1, f):
+    h = (x_1 - x__1) / 2
+    x_0 = (x__1 + x_1) / 2
+    approx = 2 * h * f(x_0)
+    return approx
+
+
+def error_open_newton_zero(x__1, x_1, f_2_prime, num_points=100, method='refine'):
+    h = (x_1 - x__1) / 2
+    max_second_derivative = derivative_bound(f_2_prime, x__1, x_1, num_points, method)
+    error = abs((h ** 3 / 3) * max_second_derivative)
+    return error
+
+
+def open_newton_one(x__1, x_2, f):
+    h = (x_2 - x__1) / 3
+    x_0 = x__1 + h
+    x_1 = x__1 + 2 * h
+    approx = (h * 3 / 2) * (f(x_0) + f(x_1))
+    return approx
+
+
+def error_open_newton_one(x__1, x_2, f_2_prime, num_points=100, method='refine'):
+    h = (x_2 - x__1) / 3
+    max_second_derivative = derivative_bound(f_2_prime, x__1, x_2, num_points, method)
+    error = abs((h ** 3 * (3 / 4)) * max_second_derivative)
+    return error
+
+
+def open_newton_two(x__1, x_3, f):
+    h = (x_3 - x__1) / 4
+    x_0 = x__1 + h
+    x_1 = x__1 + 2 * h
+    x_2 = x__1 + 3 * h
+    approx = (h * 4 / 3) * (2 * f(x_0) - f(x_1) + 2 * f(x_2))
+    return approx
+
+
+def error_open_newton_two(x__1, x_3, f_4_prime, num_points=100, method='refine'):
+    h = (x_3 - x__1) / 4
+    max_fourth_derivative = derivative_bound(f_4_prime, x__1, x_3, num_points, method)
+    error = abs((h ** 5 * (14 / 45)) * max_fourth_derivative)
+    return error
+
+
+def open_newton_three(x__1, x_4, f):
+    h = (x_4 - x__1) / 5
+    x_0 = x__1 + h
+    x_1 = x__1 + 2 * h
+    x_2 = x__1 + 3 * h
+    x_3 = x__1 + 4 * h
+    approx = (h * 5 / 24) * (11 * f(x_0) + f(x_1) + f(x_2) + 11 * f(x_3))
+    return approx
+
+
+def error_open_newton_three(x__1, x_4, f_4_prime, num_points=100, method='refine'):
+    h = (x_4 - x__1) / 5
+    max_fourth_derivative = derivative_bound(f_4_prime, x__1, x_4, num_points, method)
+    error = abs((h ** 5 * (95 / 144)) * max_fourth_derivative)
+    return error
+
+
+# Gaussian methods
+
+KRONROD_NODES = [
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.000000000000000000000000000000000,
+]
+KRONROD_WEIGHTS = [
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+]
+GAUSS_SEVEN_WEIGHTS = [
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327,
+]
+
+
+@functools.lru_cache(maxsize=64)
+def gauss_legendre_nodes(order):
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    nodes.flags.writeable = False
+    weights.flags.writeable = False
+    return nodes, weights
+
+
+@functools.lru_cache(maxsize=1)
+def gauss_kronrod_nodes():
+    half = np.array(KRONROD_NODES)
+    nodes = np.concatenate([-half[:-1], half[::-1]])
+    kronrod_weights = np.concatenate([KRONROD_WEIGHTS[:-1], KRONROD_WEIGHTS[::-1]])
+    gauss_half = np.zeros(len(half))
+    gauss_half[1::2] = GAUSS_SEVEN_WEIGHTS
+    gauss_weights = np.concatenate([gauss_half[:-1], gauss_half[::-1]])
+    for array in (nodes, kronrod_weights, gauss_weights):
+        array.flags.writeable = False
+    return nodes, kronrod_weights, gauss_weights
+
+
+def gauss_legendre(a, b, f, order=5):
+    nodes, weights = gauss_legendre_nodes(order)
+    h = (b - a) / 2
+    y = evaluate_nodes(f, h * nodes + (a + b) / 2)
+    approx = h * np.sum(weights * y)
+    return approx
+
+
+def error_gauss_legendre(a, b, f_2n_prime, order, num_points=100, method='refine'):
+    max_derivative = derivative_bound(f_2n_prime, a, b, num_points, method)
+    constant = math.factorial(order) ** 4 / ((2 * order + 1) * math.factorial(2 * order) ** 3)
+    error = abs((b - a) ** (2 * order + 1) * constant * max_derivative)
+    return error
+
+
+def gauss_kronrod(a, b, f):
+    nodes, kronrod_weights, gauss_weights = gauss_kronrod_nodes()
+    h = (b - a) / 2
+    y = evaluate_nodes(f, h * nodes + (a + b) / 2)
+    approx = h * np.sum(kronrod_weights * y)
+    error = abs(approx - h * np.sum(gauss_weights * y))
+    return approx, error
+
+
+# Clenshaw-Curtis methods
+
+@functools.lru_cache(maxsize=64)
+def clenshaw_curtis_weights(n):
+    nodes = np.cos(np.pi * np.arange(n + 1) / n)
+    if n == 1:
+        return nodes, np.ones(2)
+
+    odd = np.arange(1, n, 2)
+    m = n - len(odd)
+    v = np.concatenate([2 / odd / (odd - 2), [1 / odd[-1]], np.zeros(m)])
+    v = -v[:-1] - v[:0:-1]
+    g = -np.ones(n)
+    g[len(odd)] += n
+    g[m] += n
+    g /= n ** 2 - 1 + n % 2
+    weights = np.fft.ifft(v + g).real
+    weights = np.concatenate([weights, weights[:1]])
+    nodes.flags.writeable = False
+    weights.flags.writeable = False
+    return nodes, weights
+
+
+def clenshaw_curtis(a, b, f, tol=1e-12, n=None, max_n=2 ** 16):
+    center = (a + b) / 2
+    half = (b - a) / 2
+    m = 2
+    if n is not None:
+        m = n
+        while m % 2 == 0 and m > 2:
+            m //= 2
+
+    nodes, weights = clenshaw_curtis_weights(m)
+    y = np.array(evaluate_nodes(f, center + half * nodes), dtype=float)
+    evaluations = m + 1
+    levels = [(m, half * float(np.dot(weights, y)))]
+    error = None
+
+    while m < (n or max_n):
+        m *= 2
+        nodes, weights = clenshaw_curtis_weights(m)
+        values = np.empty(m + 1)
+        values[::2] = y
+        values[1::2] = evaluate_nodes(f, center + half * nodes[1::2])
+        y = values
+        evaluations += m // 2
+        levels.append((m, half * float(np.dot(weights, y))))
+        error = abs(levels[-1][1] - levels[-2][1])
+        if n is None and m >= 8 and error <= tol:
+            break
+
+    return levels[-1][1], error, levels, evaluations
+
+
+# Composite methods
+
+def evaluate_nodes(f, x):
+    try:
+        values = np.asarray(f(x))
+    except (TypeError, ValueError, AttributeError):
+        values = None
+
+    if values is None or values.dtype == object or values.shape not in [(), x.shape]:
+        values = np.array([f(node) for node in x], dtype=float)
+
+    return np.broadcast_to(values, x.shape)
+
+
+def compensated_add(total, compensation, value):
+    t = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - t) + value
+    else:
+        compensation += (value - t) + total
+    return t, compensation
+
+
+def chunked_weighted_sum(a, b, f, n, weights, chunk_size):
+    h = (b - a) / n
+    total = 0.0
+    compensation = 0.0
+
+    for start in range(0, n + 1, chunk_size):
+        i = np.arange(start, min(start + chunk_size, n + 1))
+        x = a + i * h
+        x[i == n] = b
+        chunk = np.sum(weights(i, n) * evaluate_nodes(f, x))
+        total, compensation = compensated_add(total, compensation, chunk)
+
+    return total + compensation
+
+
+def trapezoidal_weights(i, n):
+    return np.where((i == 0) | (i == n), 1.0, 2.0)
+
+
+def simpson_weights(i, n):
+    return np.where((i == 0) | (i == n), 1.0, np.where(i % 2 == 1, 4.0, 2.0))
+
+
+def composite_trapezoidal(a, b, f, n, mode='vectorized', chunk_size=2 ** 20):
+    h = (b - a) / n
+
+    if mode == 'chunked':
+        return (h / 2) * chunked_weighted_sum(a, b, f, n, trapezoidal_weights, chunk_size)
+
+    x = np.linspace(a, b, n + 1)
+
+    if mode == 'loop':
+        approx = f(a) + f(b)
+
+        for i in range(1, n):
+            approx += 2 * f(x[i])
+
+        approx *= h / 2
+        return approx
+
+    if mode != 'vectorized':
+        print("mode must be 'vectorized', 'chunked' or 'loop'")
+        return None
+
+    y = evaluate_nodes(f, x)
+    approx = (h / 2) * (y[0] + y[-1] + 2 * np.sum(y[1:-1]))
+    return approx
+
+
+def error_composite_trapezoidal(a, b, f_2_prime, n, num_points=100, method='refine'):
+    h = (b - a) / n
+    max_second_derivative = derivative_bound(f_2_prime, a, b, num_points, method)
+    error = abs((1 / 12) * ((b - a) * (h ** 2)) * max_second_derivative)
+    return error
+
+
+def composite_simpsom(a, b, f, n, mode='vectorized', chunk_size=2 ** 20):
+    if n % 2 != 0:
+        print("n must be an even number")
+        return None
+
+    h = (b - a) / n
+
+    if mode == 'chunked':
+        return (h / 3) * chunked_weighted_sum(a, b, f, n, simpson_weights, chunk_size)
+
+    x = np.linspace(a, b, n + 1)
+
+    if mode == 'loop':
+        approx = f(a) + f(b)
+
+        for i in range(1, n):
+            if i % 2 == 0:
+                approx += 2 * f(x[i])
+            else:
+                approx += 4 * f(x[i])
+
+        approx *= h / 3
+        return approx
+
+    if mode != 'vectorized':
+        print("mode must be 'vectorized', 'chunked' or 'loop'")
+        return None
+
+    y = evaluate_nodes(f, x)
+    approx = (h / 3) * (y[0] + y[-1] + 4 * np.sum(y[1:-1:2]) + 2 * np.sum(y[2:-1:2]))
+    return approx
+
+
+def error_composite_simpsom(a, b, f_4_prime, n, num_points=100, method='refine'):
+    if n % 2 != 0:
+        print("n must be an even number")
+        return None
+
+    h = (b - a) / n
+    max_fourth_derivative = derivative_bound(f_4_prime, a, b, num_points, method)
+    error = abs((1 / 180) * ((b - a) * (h ** 4)) * max_fourth_derivative)
+    return error
+
+
+COMPOSITE_RULES = {
+    'trapezoidal': (composite_trapezoidal, error_composite_trapezoidal, 12, 2, 1),
+    'simpson': (composite_simpsom, error_composite_simpsom, 180, 4, 2),
+}
+
+
+def composite_n(a, b, f_prime, tol, rule='trapezoidal', num_points=100, method='refine'):
+    if rule not in COMPOSITE_RULES:
+        print("rule must be one of: " + ", ".join(COMPOSITE_RULES))
+        return None
+
+    _, error_rule, factor, order, step = COMPOSITE_RULES[rule]
+    bound = derivative_bound(f_prime, a, b, num_points, method)
+    if bound is None or not math.isfinite(bound):
+        print("The derivative is unbounded on [a, b]; no n meets the tolerance")
+        return None
+
+    n = math.ceil((abs(b - a) ** (order + 1) * bound / (factor * tol)) ** (1 / order))
+    n = max(step, n + n % step)
+    while error_rule(a, b, f_prime, n, num_points, method) > tol:
+        n += step
+    return n
+
+
+def composite_tolerance(a, b, f, f_prime, tol, rule='trapezoidal', num_points=100, method='refine'):
+    n = composite_n(a, b, f_prime, tol, rule, num_points, method)
+    if n is None:
+        return None
+
+    kernel, error_rule = COMPOSITE_RULES[rule][:2]
+    approx = kernel(a, b, f, n)
+    error = error_rule(a, b, f_prime, n, num_points, method)
+    return approx, error, n, n + 1
+
+
+# Adaptive methods
+
+class NodeCache:
+    def __init__(self, f, grid_size=4096):
+        self.__dict__.update(getattr(f, '__dict__', {}))
+        self.f = f
+        self.values = {}
+        self.grids = {}
+        self.grid_size = grid_size
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, x):
+        if np.ndim(x) == 0:
+            key = float(x)
+            if key in self.values:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.values[key] = self.f(x)
+            return self.values[key]
+
+        x = np.asarray(x, dtype=float)
+        if x.size > self.grid_size:
+            key = (x.shape, x.tobytes())
+            if key in self.grids:
+                self.hits += x.size
+            else:
+                self.misses += x.size
+                self.grids[key] = np.array(evaluate_nodes(self.f, x))
+            return self.grids[key]
+
+        keys = x.ravel().tolist()
+        missing = [key for key in dict.fromkeys(keys) if key not in self.values]
+        if missing:
+            self.values.update(zip(missing, evaluate_nodes(self.f, np.array(missing)).tolist()))
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return np.array([self.values[key] for key in keys], dtype=float).reshape(x.shape)
+
+
+ADAPTIVE_RULES = {
+    'simpson': (simpson, 3, 15),
+    'simpson_three_eighths': (simpson_three_eighths, 4, 15),
+    'closed_newton_four': (closed_newton_four, 5, 63),
+}
+
+
+def adaptive_quadrature(a, b, f, tol=1e-8, max_evaluations=10000, rule='simpson'):
+    if rule not in ADAPTIVE_RULES:
+        print("rule must be one of: " + ", ".join(ADAPTIVE_RULES))
+        return None
+
+    kernel, points, factor = ADAPTIVE_RULES[rule]
+    split_cost = 2 * (points - 1)
+    g = NodeCache(f)
+
+    def refine(x_0, x_1, whole):
+        x_m = (x_0 + x_1) / 2
+        left = kernel(x_0, x_m, g)
+        right = kernel(x_m, x_1, g)
+        error = abs(left + right - whole) / factor
+        approx = left + right + (left + right - whole) / factor
+        return (-error, x_0, x_1, left, right, approx)
+
+    heap = [refine(a, b, kernel(a, b, g))]
+    finished = []
+    total_error = -heap[0][0]
+
+    while heap and total_error > tol and g.misses + split_cost <= max_evaluations:
+        interval = heapq.heappop(heap)
+        neg_error, x_0, x_1, left, right, approx = interval
+        x_m = (x_0 + x_1) / 2
+        if x_m <= x_0 or x_m >= x_1:
+            finished.append(interval)
+            continue
+
+        total_error += neg_error
+        for child in (refine(x_0, x_m, left), refine(x_m, x_1, right)):
+            heapq.heappush(heap, child)
+            total_error -= child[0]
+
+    intervals = heap + finished
+    approx = math.fsum(interval[5] for interval in intervals)
+    error = math.fsum(-interval[0] for interval in intervals)
+    return approx, error, g.misses
+
+
+def romberg(a, b, f, tol=1e-10, max_levels=20):
+    h = b - a
+    y = evaluate_nodes(f, np.array([a, b], dtype=float))
+    evaluations = 2
+    tableau = [[float((h / 2) * (y[0] + y[1]))]]
+    error = float('inf')
+
+    for k in range(1, max_levels):
+        h /= 2
+        x = a + h * (2 * np.arange(2 ** (k - 1)) + 1)
+        y = evaluate_nodes(f, x)
+        evaluations += len(x)
+
+        row = [tableau[-1][0] / 2 + float(h * np.sum(y))]
+        for j in range(1, k + 1):
+            row.append(row[j - 1] + (row[j - 1] - tableau[-1][j - 1]) / (4 ** j - 1))
+        tableau.append(row)
+
+        error = abs(row[-1] - tableau[-2][-1])
+        if k > 1 and error <= tol:
+            break
+
+    return tableau[-1][-1], error, tableau, evaluations
+
+
+# Double-exponential methods
+
+DE_T_MAX = 6.5
+
+
+@functools.lru_cache(maxsize=64)
+def double_exponential_level(kind, level):
+    h = 2.0 ** -level
+    if level == 0:
+        t = np.arange(0, DE_T_MAX + h, h)
+    else:
+        t = np.arange(h, DE_T_MAX, 2 * h)
+    if kind == 'exp_sinh':
+        t = np.concatenate([-t[::-1], t[1:] if level == 0 else t])
+
+    s = np.pi / 2 * np.sinh(t)
+    with np.errstate(over='ignore', under='ignore'):
+        if kind == 'tanh_sinh':
+            nodes = 2 / (np.exp(2 * s) + 1)
+            weights = np.pi / 2 * np.cosh(t) / np.cosh(s) ** 2
+        elif kind == 'exp_sinh':
+            nodes = np.exp(s)
+            weights = np.pi / 2 * np.cosh(t) * nodes
+        else:
+            nodes = np.sinh(s)
+            weights = np.pi / 2 * np.cosh(t) * np.cosh(s)
+
+    if kind != 'exp_sinh' and level == 0:
+        weights[0] /= 2
+    keep = np.isfinite(nodes) & np.isfinite(weights) & (weights > 0) & ((nodes > 0) | (t == 0))
+    nodes, weights = nodes[keep], weights[keep]
+    nodes.flags.writeable = False
+    weights.flags.writeable = False
+    return nodes, weights
+
+
+def double_exponential_sum(a, b, f, kind, level):
+    nodes, weights = double_exponential_level(kind, level)
+    if kind == 'tanh_sinh':
+        half = (b - a) / 2
+        left = a + half * nodes
+        right = b - half * nodes
+        x = np.concatenate([left[left > a], right[right < b]])
+        weights = half * np.concatenate([weights[left > a], weights[right < b]])
+    elif kind == 'exp_sinh':
+        x = a + nodes if math.isfinite(a) else b - nodes
+    else:
+        x = np.concatenate([nodes, -nodes])
+        weights = np.concatenate([weights, weights])
+
+    with np.errstate(all='ignore'):
+        terms = weights * evaluate_nodes(f, x)
+    return math.fsum(terms[np.isfinite(terms)]), x.size
+
+
+def double_exponential(a, b, f, tol=1e-12, max_levels=10):
+    if a == b:
+        return 0.0, 0.0, 0
+    if a > b:
+        approx, error, evaluations = double_exponential(b, a, f, tol, max_levels)
+        return -approx, error, evaluations
+
+    if math.isfinite(a) and math.isfinite(b):
+        kind = 'tanh_sinh'
+    elif math.isfinite(a) or math.isfinite(b):
+        kind = 'exp_sinh'
+    else:
+        kind = 'sinh_sinh'
+
+    total, evaluations = double_exponential_sum(a, b, f, kind, 0)
+    approx = total
+    error = float('inf')
+
+    for level in range(1, max_levels + 1):
+        level_sum, level_evaluations = double_exponential_sum(a, b, f, kind, level)
+        total += level_sum
+        evaluations += level_evaluations
+        previous, approx = approx, total * 2.0 ** -level
+        error = abs(approx - previous)
+        if level > 2 and error <= tol:
+            break
+
+    return approx, error, evaluations
+
+
+# Cubature
+
+def evaluate_points(f, points):
+    values = np.asarray(f(*points.T))
+    return np.broadcast_to(values, points.shape[:1])
+
+
+def cubature_sum(f, points, weights, chunk_size):
+    totals = np.zeros(len(weights))
+    compensations = np.zeros(len(weights))
+    for start in range(0, len(points), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        values = evaluate_points(f, points[chunk])
+        for k, row in enumerate(weights):
+            value = float(np.dot(row[chunk], values))
+            totals[k], compensations[k] = compensated_add(totals[k], compensations[k], value)
+    return totals + compensations
+
+
+TENSOR_RULES = {
+    'trapezoidal': (trapezoidal_weights, 2, 1, 2),
+    'simpson': (simpson_weights, 3, 2, 4),
+}
+
+
+def tensor_product(lower, upper, f, n, rule='simpson', chunk_size=2 ** 16):
+    if rule not in TENSOR_RULES:
+        print("rule must be one of: " + ", ".join(TENSOR_RULES))
+        return None
+
+    weights_rule, divisor, step, order = TENSOR_RULES[rule]
+    if n % step != 0:
+        print("n must be an even number")
+        return None
+
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    d = len(lower)
+    h = (upper - lower) / n
+    i = np.arange(n + 1)
+    fine = weights_rule(i, n) / divisor
+    coarse = None
+    if n % (2 * step) == 0:
+        coarse = np.where(i % 2 == 0, weights_rule(i // 2, n // 2), 0.0) * 2 / divisor
+
+    total = compensation = 0.0
+    coarse_total = coarse_compensation = 0.0
+    for start in range(0, (n + 1) ** d, chunk_size):
+        index = np.unravel_index(np.arange(start, min(start + chunk_size, (n + 1) ** d)), (n + 1,) * d)
+        points = np.column_stack([lower[k] + index[k] * h[k] for k in range(d)])
+        for k in range(d):
+            points[index[k] == n, k] = upper[k]
+        values = evaluate_points(f, points)
+        weights = np.prod([fine[index[k]] for k in range(d)], axis=0)
+        total, compensation = compensated_add(total, compensation, float(np.dot(weights, values)))
+        if coarse is not None:
+            weights = np.prod([coarse[index[k]] for k in range(d)], axis=0)
+            coarse_total, coarse_compensation = compensated_add(coarse_total, coarse_compensation,
+                                                                float(np.dot(weights, values)))
+
+    volume = np.prod(h)
+    approx = volume * (total + compensation)
+    error = None
+    if coarse is not None:
+        error = float(abs(approx - volume * (coarse_total + coarse_compensation)) / (2 ** order - 1))
+    return float(approx), error, (n + 1) ** d
+
+
+def level_indices(d, low, high):
+    if d == 1:
+        for level in range(max(low, 1), high + 1):
+            yield (level,)
+        return
+    for level in range(1, high - d + 2):
+        for rest in level_indices(d - 1, low - level, high - level):
+            yield (level,) + rest
+
+
+def sparse_grid_weights(d, level, finest):
+    rules = {1: (np.array([finest // 2]), np.array([2.0]))}
+    for k in range(2, level + 1):
+        n = 2 ** (k - 1)
+        rules[k] = (np.arange(n + 1) * (finest // n), clenshaw_curtis_weights(n)[1])
+
+    indices = []
+    weights = []
+    q = level + d - 1
+    for levels in level_indices(d, max(d, q - d + 1), q):
+        coefficient = (-1) ** (q - sum(levels)) * math.comb(d - 1, q - sum(levels))
+        grids = np.meshgrid(*[rules[k][0] for k in levels], indexing='ij')
+        products = np.meshgrid(*[rules[k][1] for k in levels], indexing='ij')
+        indices.append(np.column_stack([grid.ravel() for grid in grids]))
+        weights.append(coefficient * np.prod([product.ravel() for product in products], axis=0))
+    return np.concatenate(indices), np.concatenate(weights)
+
+
+def sparse_grid(lower, upper, f, level=5, chunk_size=2 ** 16):
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    d = len(lower)
+    finest = 2 ** max(level - 1, 1)
+
+    indices, weights = sparse_grid_weights(d, level, finest)
+    coarse_indices, coarse_weights = sparse_grid_weights(d, max(level - 1, 1), finest)
+    points, inverse = np.unique(np.concatenate([indices, coarse_indices]), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    fine = np.bincount(inverse[:len(weights)], weights, len(points))
+    coarse = np.bincount(inverse[len(weights):], coarse_weights, len(points))
+    used = (fine != 0) | (coarse != 0)
+    points, fine, coarse = points[used], fine[used], coarse[used]
+
+    half = (upper - lower) / 2
+    x = (lower + upper) / 2 + half * np.cos(np.pi * points / finest)
+    approx, coarse_approx = np.prod(half) * cubature_sum(f, x, [fine, coarse], chunk_size)
+    error = float(abs(approx - coarse_approx)) if level > 1 else None
+    return float(approx), error, len(points)
+
+
+# Sobol sequences: dimension 1 uses the identity matrix, the others the
+# primitive polynomials and initial direction numbers of Joe and Kuo.
+SOBOL_POLYNOMIALS = [
+    (1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]), (5, 2, [1, 1, 5, 5, 17]), (5, 4, [1, 1, 5, 5, 5]), (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]), (5, 13, [1, 1, 1, 3, 11]), (5, 14, [1, 3, 5, 5, 31]), (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]), (6, 16, [1, 3, 1, 13, 27, 49]), (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]), (6, 25, [1, 1, 5, 5, 19, 61]), (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+SOBOL_BITS = 32
+
+
+@functools.lru_cache(maxsize=16)
+def sobol_directions(d):
+    directions = np.zeros((d, SOBOL_BITS), dtype=np.uint64)
+    directions[0] = [1 << (SOBOL_BITS - 1 - j) for j in range(SOBOL_BITS)]
+    for k, (s, a, m) in enumerate(SOBOL_POLYNOMIALS[:d - 1], start=1):
+        v = [m_j << (SOBOL_BITS - 1 - j) for j, m_j in enumerate(m)]
+        for j in range(s, SOBOL_BITS):
+            value = v[j - s] ^ (v[j - s] >> s)
+            for i in range(1, s):
+                if (a >> (s - 1 - i)) & 1:
+                    value ^= v[j - i]
+            v.append(value)
+        directions[k] = v
+    directions.flags.writeable = False
+    return directions
+
+
+def scramble_directions(directions, rng):
+    d, bits = directions.shape
+    rows = np.zeros((d, bits), dtype=np.uint64)
+    for i in range(bits):
+        below = rng.integers(0, 2 ** i, size=d, dtype=np.uint64) if i else np.zeros(d, dtype=np.uint64)
+        rows[:, i] = (np.uint64(1) << np.uint64(bits - 1 - i)) | (below << np.uint64(bits - i))
+
+    scrambled = np.zeros_like(directions)
+    for i in range(bits):
+        parity = np.bitwise_count(rows[:, i:i + 1] & directions).astype(np.uint64) & np.uint64(1)
+        scrambled |= parity << np.uint64(bits - 1 - i)
+    shift = rng.integers(0, 2 ** bits, size=d, dtype=np.uint64)
+    return scrambled, shift
+
+
+def sobol_points(directions, shift, start, stop):
+    i = np.arange(start, stop, dtype=np.uint64)
+    gray = i ^ (i >> np.uint64(1))
+    x = np.tile(shift, (len(i), 1))
+    for j in range(directions.shape[1]):
+        bit = ((gray >> np.uint64(j)) & np.uint64(1)).astype(bool)
+        x[bit] ^= directions[:, j]
+    return (x.astype(float) + 0.5) / 2.0 ** directions.shape[1]
+
+
+def quasi_monte_carlo(lower, upper, f, tol=1e-6, max_points=2 ** 20, replicates=8, seed=None,
+                      chunk_size=2 ** 14):
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    if len(lower) > len(SOBOL_POLYNOMIALS) + 1:
+        print(f"Sobol points are available in at most {len(SOBOL_POLYNOMIALS) + 1} dimensions")
+        return None
+    # max_points is the budget over all replicates, each of which starts with 256 points
+    if replicates < 2 or max_points < 256 * replicates:
+        print("replicates must be at least 2 and max_points at least 256 * replicates")
+        return None
+
+    directions = sobol_directions(len(lower))
+    rng = np.random.default_rng(seed)
+    scrambles = [scramble_directions(directions, rng) for _ in range(replicates)]
+
+    sums = np.zeros(replicates)
+    n = 0
+    target = 2 ** 8
+    volume = np.prod(upper - lower)
+    while True:
+        stop = min(n + chunk_size, target)
+        for r, (scrambled, shift) in enumerate(scrambles):
+            points = lower + (upper - lower) * sobol_points(scrambled, shift, n, stop)
+            sums[r] += math.fsum(evaluate_points(f, points))
+        n = stop
+
+        if n == target:
+            estimates = volume * sums / n
+            approx = float(np.mean(estimates))
+            error = float(np.std(estimates, ddof=1) / np.sqrt(replicates))
+            if error <= tol or 2 * n * replicates > max_points:
+                return approx, error, n * replicates
+            target *= 2
+
+
+def buffered(f):
+    if getattr(f, 'buffered', False):
+        return f
+
+    def rhs(t, y, out):
+        out[...] = f(t, y)
+        return out
+
+    return rhs
+
+
+def euler_stepper(f, y):
+    if np.ndim(y) == 0:
+        return lambda x, y, h: y + h * f(x, y)
+
+    rhs = buffered(f)
+    k = np.empty_like(y)
+
+    def step(x, y, h):
+        rhs(x, y, k)
+        np.multiply(k, h, out=k)
+        y += k
+        return y
+
+    return step
+
+
+def euler_method(f, a, b, y0, n):
+    h = (b - a) / n
+    x_values = a + h * np.arange(n + 1)
+
+    if np.ndim(y0) == 0:
+        y_values = np.empty(n + 1)
+        y = y0
+        y_values[0] = y
+
+        for i in range(1, n + 1):
+            y = y + h * f(x_values[i - 1], y)
+            y_values[i] = y
+
+        return x_values, y_values
+
+    y = np.array(y0, dtype=float)
+    step = euler_stepper(f, y)
+    y_values = np.empty((n + 1,) + y.shape)
+    y_values[0] = y
+
+    for i in range(1, n + 1):
+        y = step(x_values[i - 1], y, h)
+        y_values[i] = y
+
+    return x_values, y_values
+
+
+def euler_ensemble(f, a, b, y0, n, parameters=()):
+    h = (b - a) / n
+    x_values = a + h * np.arange(n + 1)
+    parameters = [np.asarray(p, dtype=float) for p in parameters]
+    shape = np.broadcast_shapes(np.shape(y0), *[p.shape for p in parameters])
+    y = np.array(np.broadcast_to(np.asarray(y0, dtype=float), shape))
+    y_values = np.empty((n + 1,) + y.shape)
+    y_values[0] = y
+
+    for i in range(1, n + 1):
+        y += h * f(x_values[i - 1], y, *parameters)
+        y_values[i] = y
+
+    return x_values, y_values
+
+
+# Runge-Kutta methods
+
+def rk4_stepper(f, y):
+    if np.ndim(y) == 0:
+        def step(x, y, h):
+            k_1 = f(x, y)
+            k_2 = f(x + h / 2, y + (h / 2) * k_1)
+            k_3 = f(x + h / 2, y + (h / 2) * k_2)
+            k_4 = f(x + h, y + h * k_3)
+            return y + (h / 6) * (k_1 + 2 * k_2 + 2 * k_3 + k_4)
+
+        return step
+
+    rhs = buffered(f)
+    k_1, k_2, k_3, k_4, state = [np.empty_like(y) for _ in range(5)]
+
+    def step(x, y, h):
+        rhs(x, y, k_1)
+        np.multiply(k_1, h / 2, out=state)
+        np.add(state, y, out=state)
+        rhs(x + h / 2, state, k_2)
+        np.multiply(k_2, h / 2, out=state)
+        np.add(state, y, out=state)
+        rhs(x + h / 2, state, k_3)
+        np.multiply(k_3, h, out=state)
+        np.add(state, y, out=state)
+        rhs(x + h, state, k_4)
+
+        np.add(k_2, k_3, out=k_2)
+        np.multiply(k_2, 2, out=k_2)
+        np.add(k_1, k_2, out=k_1)
+        np.add(k_1, k_4, out=k_1)
+        np.multiply(k_1, h / 6, out=k_1)
+        y += k_1
+        return y
+
+    return step
+
+
+def rk4_method(f, a, b, y0, n):
+    h = (b - a) / n
+    x_values = a + h * np.arange(n + 1)
+    y = np.array(y0, dtype=float)
+    step = rk4_stepper(f, y)
+    y_values = np.empty((n + 1,) + y.shape)
+    y_values[0] = y
+
+    for i in range(1, n + 1):
+        y = step(x_values[i - 1], y, h)
+        y_values[i] = y
+
+    return x_values, y_values
+
+
+# Trajectory streaming
+
+class NpyTrajectorySink:
+    def __init__(self, path, rows, columns):
+        self.array = np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=(rows, columns))
+        self.position = 0
+
+    def write(self, chunk):
+        self.array[self.position:self.position + len(chunk)] = chunk
+        self.position += len(chunk)
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+
+class BinaryTrajectorySink:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+
+    def write(self, chunk):
+        chunk.tofile(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class CsvTrajectorySink:
+    def __init__(self, path, names):
+        self.file = open(path, 'w')
+        self.file.write(','.join(['t'] + list(names)) + '\n')
+
+    def write(self, chunk):
+        np.savetxt(self.file, chunk, delimiter=',', fmt='%.17g')
+
+    def close(self):
+        self.file.close()
+
+
+def trajectory_rows(n, stride):
+    return 1 + n // stride + (1 if n % stride else 0)
+
+
+def trajectory_sink(path, n, y0, stride=1, names=None):
+    columns = 1 + np.size(y0)
+    if names is None:
+        names = ['y'] if columns == 2 else [f'y{i}' for i in range(1, columns)]
+    if path.endswith('.npy'):
+        return NpyTrajectorySink(path, trajectory_rows(n, stride), columns)
+    if path.endswith('.csv'):
+        return CsvTrajectorySink(path, names)
+    return BinaryTrajectorySink(path)
+
+
+STREAM_STEPPERS = {
+    'euler': euler_stepper,
+    'rk4': rk4_stepper,
+}
+
+
+def stream_trajectory(stepper, f, a, b, y0, n, sink, stride=1, chunk_size=65536):
+    h = (b - a) / n
+    y = np.array(y0, dtype=float) if np.ndim(y0) else float(y0)
+    step = stepper(f, y)
+    chunk = np.empty((chunk_size, 1 + np.size(y)))
+    chunk[0, 0] = a
+    chunk[0, 1:] = y
+    rows = 1
+
+    try:
+        for i in range(1, n + 1):
+            y = step(a + (i - 1) * h, y, h)
+            if i % stride == 0 or i == n:
+                chunk[rows, 0] = a + i * h
+                chunk[rows, 1:] = y
+                rows += 1
+                if rows == chunk_size:
+                    sink.write(chunk)
+                    rows = 0
+
+        if rows:
+            sink.write(chunk[:rows])
+    finally:
+        sink.close()
+
+    return y
+
+
+DORMAND_PRINCE_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+DORMAND_PRINCE_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+]
+DORMAND_PRINCE_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+DORMAND_PRINCE_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+DORMAND_PRINCE_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+
+
+def rms_norm(x):
+    return float(np.sqrt(np.mean(np.square(x))))
+
+
+def initial_step(f, a, y, f_0, direction, rtol, atol):
+    scale = atol + rtol * np.abs(y)
+    d_0 = rms_norm(y / scale)
+    d_1 = rms_norm(f_0 / scale)
+    h_0 = 1e-6 if d_0 < 1e-5 or d_1 < 1e-5 else 0.01 * d_0 / d_1
+
+    f_1 = f(a + direction * h_0, y + direction * h_0 * f_0)
+    d_2 = rms_norm((f_1 - f_0) / scale) / h_0
+    if max(d_1, d_2) <= 1e-15:
+        h_1 = max(1e-6, h_0 * 1e-3)
+    else:
+        h_1 = (0.01 / max(d_1, d_2)) ** (1 / 5)
+
+    return min(100 * h_0, h_1)
+
+
+def dense_output(x_values, y_values, steps, q_values):
+    direction = 1.0 if x_values[-1] >= x_values[0] else -1.0
+
+    def solution(x):
+        x = np.asarray(x, dtype=float)
+        i = np.searchsorted(direction * x_values, direction * x, side='right') - 1
+        i = np.clip(i, 0, len(steps) - 1)
+        theta = (x - x_values[i]) / steps[i]
+        powers = np.stack([theta, theta ** 2, theta ** 3, theta ** 4], axis=-1)
+        powers = powers.reshape(powers.shape[:-1] + (1,) * (y_values.ndim - 1) + (4,))
+        h = steps[i].reshape(steps[i].shape + (1,) * (y_values.ndim - 1))
+        return y_values[i] + h * np.sum(q_values[i] * powers, axis=-1)
+
+    return solution
+
+
+def dormand_prince(f, a, b, y0, rtol=1e-6, atol=1e-9, h=None, max_steps=100000):
+    direction = 1.0 if b >= a else -1.0
+    rhs = buffered(f)
+    x = a
+    y = np.asarray(y0, dtype=float)
+    k = np.empty((7,) + y.shape)
+    rhs(x, y, k[0, ...])
+    evaluations = 1
+
+    if h is None:
+        h = initial_step(f, a, y, k[0], direction, rtol, atol)
+        evaluations += 1
+    h = abs(h)
+
+    x_values = [x]
+    y_values = [y]
+    steps = []
+    q_values = []
+    rejected = 0
+
+    while direction * (b - x) > 0:
+        if len(steps) >= max_steps:
+            print("Maximum number of steps reached")
+            break
+
+        h = min(h, abs(b - x))
+        while True:
+            step = direction * h
+            for s in range(1, 6):
+                dy = np.tensordot(DORMAND_PRINCE_A[s], k[:s], axes=1)
+                rhs(x + DORMAND_PRINCE_C[s] * step, y + step * dy, k[s, ...])
+            y_new = y + step * np.tensordot(DORMAND_PRINCE_B[:6], k[:6], axes=1)
+            rhs(x + step, y_new, k[6, ...])
+            evaluations += 6
+
+            error = step * np.tensordot(DORMAND_PRINCE_E, k, axes=1)
+            scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+            error_norm = rms_norm(error / scale)
+
+            if error_norm <= 1:
+                break
+            rejected += 1
+            h *= max(0.2, 0.9 * error_norm ** (-1 / 5))
+
+        q_values.append(np.tensordot(k, DORMAND_PRINCE_P, axes=(0, 0)))
+        steps.append(step)
+        x = x + step if abs(b - (x + step)) > 1e-12 * abs(step) else b
+        y = y_new
+        k[0] = k[6]
+        x_values.append(x)
+        y_values.append(y)
+        h *= 10 if error_norm == 0 else min(10, 0.9 * error_norm ** (-1 / 5))
+
+    x_values = np.array(x_values)
+    y_values = np.array(y_values)
+    stats = {
+        'steps': len(steps),
+        'rejected': rejected,
+        'evaluations': evaluations,
+        'dense': dense_output(x_values, y_values, np.array(steps), np.array(q_values)),
+    }
+    return x_values, y_values, stats
+
+
+# Implicit methods
+
+BDF_COEFFICIENTS = [
+    None,
+    ([1], 1),
+    ([4 / 3, -1 / 3], 2 / 3),
+    ([18 / 11, -9 / 11, 2 / 11], 6 / 11),
+    ([48 / 25, -36 / 25, 16 / 25, -3 / 25], 12 / 25),
+    ([300 / 137, -300 / 137, 200 / 137, -75 / 137, 12 / 137], 60 / 137),
+]
+
+
+RADAU_C = np.array([(4 - np.sqrt(6)) / 10, (4 + np.sqrt(6)) / 10, 1])
+RADAU_A = np.array([
+    [(88 - 7 * np.sqrt(6)) / 360, (296 - 169 * np.sqrt(6)) / 1800, (-2 + 3 * np.sqrt(6)) / 225],
+    [(296 + 169 * np.sqrt(6)) / 1800, (88 + 7 * np.sqrt(6)) / 360, (-2 - 3 * np.sqrt(6)) / 225],
+    [(16 - np.sqrt(6)) / 36, (16 + np.sqrt(6)) / 36, 1 / 9],
+])
+
+
+def newton(residual, inverse, Y, tol, max_iterations):
+    previous = None
+    for iteration in range(1, max_iterations + 1):
+        dY = -inverse @ residual(Y)
+        Y = Y + dY
+        size = np.max(np.abs(dY))
+        if size <= tol * (1 + np.max(np.abs(Y))):
+            return Y, True, iteration
+        if previous is not None and size > 0.5 * previous:
+            return Y, False, iteration
+        previous = size
+    return Y, False, max_iterations
+
+
+def radau_bisection(f, jac, x, y, h, tol, max_iterations, stats, depth=16):
+    m = y.size
+
+    def residual(Z):
+        Z = Z.reshape(3, m)
+        F = np.array([np.atleast_1d(f(x + c * h, y + z)) for c, z in zip(RADAU_C, Z)])
+        return (Z - h * RADAU_A @ F).ravel()
+
+    Z = np.zeros(3 * m)
+    for _ in range(max_iterations):
+        J = np.atleast_2d(np.asarray(jac(x + h, y + Z[-m:]), dtype=float))
+        inverse = np.linalg.inv(np.eye(3 * m) - h * np.kron(RADAU_A, J))
+        stats['jacobians'] += 1
+        stats['factorizations'] += 1
+        Z, converged, iterations = newton(residual, inverse, Z, tol, max_iterations)
+        stats['evaluations'] += 3 * iterations
+        if converged:
+            return y + Z[-m:]
+        if not np.all(np.isfinite(Z)):
+            break
+
+    if depth == 0:
+        return None
+    stats['failures'] += 1
+    middle = radau_bisection(f, jac, x, y, h / 2, tol, max_iterations, stats, depth - 1)
+    if middle is None:
+        return None
+    return radau_bisection(f, jac, x + h / 2, middle, h / 2, tol, max_iterations, stats, depth - 1)
+
+
+def bdf_method(f, jac, a, b, y0, n, order=5, tol=1e-10, max_iterations=6):
+    if not 1 <= order < len(BDF_COEFFICIENTS):
+        print(f"order must be between 1 and {len(BDF_COEFFICIENTS) - 1}")
+        return None
+
+    h = (b - a) / n
+    x_values = a + h * np.arange(n + 1)
+    y = np.atleast_1d(np.asarray(y0, dtype=float)).copy()
+    m = y.size
+    y_values = np.empty((n + 1, m))
+    y_values[0] = y
+    alphas, beta = BDF_COEFFICIENTS[order]
+
+    stats = {'steps': n, 'evaluations': 0, 'jacobians': 0, 'factorizations': 0, 'failures': 0}
+    J = None
+    inverse = None
+    matrix_key = None
+    start = 0
+
+    for i in range(1, n + 1):
+        if i < start + order:
+            x = x_values[i - 1]
+            key = ('radau', h)
+            cost = 3
+            Y = np.zeros(3 * m)
+
+            def residual(Z):
+                Z = Z.reshape(3, m)
+                F = np.array([np.atleast_1d(f(x + c * h, y + z)) for c, z in zip(RADAU_C, Z)])
+                return (Z - h * RADAU_A @ F).ravel()
+        else:
+            x = x_values[i]
+            key = ('bdf', h * beta)
+            cost = 1
+            Y = y.copy()
+            history = sum(alpha * y_values[i - 1 - j] for j, alpha in enumerate(alphas))
+
+            def residual(Y):
+                return Y - history - h * beta * np.atleast_1d(f(x, Y))
+
+        if J is None:
+            J = np.atleast_2d(np.asarray(jac(x, y), dtype=float))
+            stats['jacobians'] += 1
+
+        # A failed pass refreshes J at the current iterate and carries on from it; if
+        # that still fails the step is retaken with bisected Radau IIA steps and the
+        # history is rebuilt with Radau steps, as at the start
+        Y_new = Y
+        for _ in range(max_iterations):
+            if inverse is None or matrix_key != key:
+                if key[0] == 'radau':
+                    matrix = np.eye(3 * m) - h * np.kron(RADAU_A, J)
+                else:
+                    matrix = np.eye(m) - h * beta * J
+                inverse = np.linalg.inv(matrix)
+                matrix_key = key
+                stats['factorizations'] += 1
+
+            Y_new, converged, iterations = newton(residual, inverse, Y_new, tol, max_iterations)
+            stats['evaluations'] += cost * iterations
+            if converged:
+                break
+
+            stats['failures'] += 1
+            if not np.all(np.isfinite(Y_new)):
+                break
+            current = y + Y_new[-m:] if key[0] == 'radau' else Y_new
+            J = np.atleast_2d(np.asarray(jac(x_values[i], current), dtype=float))
+            stats['jacobians'] += 1
+            inverse = None
+
+        if converged:
+            y = y + Y_new[-m:] if key[0] == 'radau' else Y_new
+        else:
+            y = radau_bisection(f, jac, x_values[i - 1], y, h, tol, max_iterations, stats)
+            if y is None:
+                print(f"Newton's method did not converge at t = {x_values[i]}; try a larger n")
+                return None
+            start = i
+        y_values[i] = y
+
+    return x_values, y_values.reshape((n + 1,) + np.shape(y0)), stats
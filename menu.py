@@ -1,359 +1,439 @@
+import builtins
+import collections
+import csv
+import functools
+import importlib
+import inspect
+import json
+import os
+import sys
+
 import numpy as np
-import matplotlib.pyplot as plt
-from sympy import *
-from prettytable import PrettyTable
 
+from disk_cache import make_key
+from instrument import counted, profiling, stage
+from kernels import (
+    trapezoidal, error_trapezoidal, simpson, error_simpson, simpson_three_eighths, error_simpson_three_eighths,
+    closed_newton_four, error_closed_newton_four, open_newton_zero, error_open_newton_zero, open_newton_one,
+    error_open_newton_one, open_newton_two, error_open_newton_two, open_newton_three, error_open_newton_three,
+    gauss_legendre, error_gauss_legendre, gauss_kronrod, clenshaw_curtis, evaluate_nodes, NodeCache,
+    composite_trapezoidal, error_composite_trapezoidal, composite_simpsom, error_composite_simpsom, composite_tolerance,
+    adaptive_quadrature, romberg, double_exponential, tensor_product, sparse_grid, quasi_monte_carlo, euler_method,
+    euler_ensemble, rk4_method, trajectory_sink, STREAM_STEPPERS, stream_trajectory, dormand_prince, bdf_method,
+)
+
+
+# Plotting
+
+PLOT_BACKEND = os.environ.get('PLOT_BACKEND', 'show')
+PLOT_DIR = os.environ.get('PLOT_DIR', '.')
+PLOT_WIDTH = 1000
+plot_count = 0
+
+
+def pyplot():
+    import matplotlib
+    if PLOT_BACKEND != 'show':
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def decimate(x, y, width=PLOT_WIDTH):
+    x = np.asarray(x)
+    y = np.reshape(y, (len(x), -1))
+    if len(x) <= 2 * width:
+        return x, y
+
+    k = -(-len(x) // width)
+    padded = np.concatenate([y, np.repeat(y[-1:], -len(x) % k, axis=0)])
+    blocks = padded.reshape(-1, k, y.shape[1])
+    offsets = np.arange(blocks.shape[0])[:, None] * k
+    indices = np.concatenate([
+        (np.argmin(blocks, axis=1) + offsets).ravel(),
+        (np.argmax(blocks, axis=1) + offsets).ravel(),
+        [0, len(x) - 1],
+    ])
+    indices = np.unique(np.minimum(indices, len(x) - 1))
+    return x[indices], y[indices]
+
+
+def show_plot(x, y, labels, title, xlabel, ylabel, style='-', xlim=None, ylim=None):
+    if PLOT_BACKEND == 'none':
+        return None
+
+    with stage('plot'):
+        return render_plot(x, y, labels, title, xlabel, ylabel, style, xlim, ylim)
+
+
+def render_plot(x, y, labels, title, xlabel, ylabel, style, xlim, ylim):
+    global plot_count
+    x, y = decimate(x, y)
+    plt = pyplot()
+    figure = plt.figure()
+    for j, label in enumerate(labels):
+        plt.plot(x, y[:, j], style, label=label, markersize=5)
+    plt.axhline(color='black', linewidth=0.5)
+    plt.axvline(color='black', linewidth=0.5)
+
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.grid(True, which='both')
+    if xlim:
+        plt.xlim(*xlim)
+    if ylim:
+        plt.ylim(*ylim)
+    plt.legend()
+
+    if PLOT_BACKEND == 'show':
+        plt.show()
+        return None
+
+    plot_count += 1
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    path = os.path.join(PLOT_DIR, f"plot-{plot_count}.{PLOT_BACKEND}")
+    figure.savefig(path)
+    plt.close(figure)
+    print(f"Plot saved to {path}")
+    return path
+
+
+def plot_derivative(f_prime, x_min, x_max, label, title, points=100):
+    xAxis = np.linspace(x_min, x_max, points)
+    return show_plot(xAxis, evaluate_nodes(f_prime, xAxis), [label], title, "x", label, xlim=(x_min, x_max))
+
+
+# Results output
+
+RESULTS_FORMAT = os.environ.get('RESULTS_FORMAT', 'table')
+RESULTS_ROW_LIMIT = int(os.environ.get('RESULTS_ROW_LIMIT', 1000))
+
+
+class TableSink:
+    def __init__(self, field_names, stream=None, row_limit=None):
+        from prettytable import PrettyTable
+        self.table = PrettyTable(field_names)
+        self.stream = stream or sys.stdout
+        self.row_limit = row_limit
+        self.head = row_limit - row_limit // 2 if row_limit else None
+        self.tail = collections.deque(maxlen=row_limit // 2 if row_limit else None)
+        self.rows = 0
+        self.omitted = 0
+
+    def add_row(self, row):
+        if self.head is None or self.rows < self.head:
+            self.table.add_row(row)
+            self.rows += 1
+            return
+        if len(self.tail) == self.tail.maxlen:
+            self.omitted += 1
+        self.tail.append(row)
+
+    # Builds only the rows that will be shown; row(i) makes the i-th row
+    def add_rows(self, count, row):
+        shown = count if self.head is None else min(count, max(self.head - self.rows, 0))
+        for i in range(shown):
+            self.add_row(row(i))
+        if shown == count:
+            return
+        pending = len(self.tail) + count - shown
+        self.omitted += pending - min(pending, self.tail.maxlen)
+        self.tail.extend(row(i) for i in range(max(shown, count - self.tail.maxlen), count))
+
+    def close(self):
+        if self.omitted:
+            self.table.add_row([f"... {self.omitted} rows omitted ..."] + [""] * (len(self.table.field_names) - 1))
+        for row in self.tail:
+            self.table.add_row(row)
+        with stage('tabulate'):
+            print(self.table, file=self.stream)
+
+
+class FixedWidthSink:
+    def __init__(self, field_names, stream=None, row_limit=None, width=24):
+        self.stream = stream or sys.stdout
+        self.row_limit = row_limit
+        self.width = width
+        self.rows = 0
+        self.last = None
+        self.write_line(field_names)
+        self.stream.write("-" * (width + 1) * len(field_names) + "\n")
+
+    def write_line(self, row):
+        self.stream.write(" ".join(f"{value!s:>{self.width}.{self.width}}" for value in row) + "\n")
+
+    def add_row(self, row):
+        self.rows += 1
+        if self.row_limit is None or self.rows <= self.row_limit:
+            self.write_line(row)
+        else:
+            self.last = row
+
+    def add_rows(self, count, row):
+        shown = count if self.row_limit is None else min(count, max(self.row_limit - self.rows, 0))
+        for i in range(shown):
+            self.add_row(row(i))
+        if shown < count:
+            self.rows += count - shown
+            self.last = row(count - 1)
+
+    def close(self):
+        if self.last is not None:
+            self.stream.write(f"... {self.rows - self.row_limit - 1} rows omitted ...\n")
+            self.write_line(self.last)
+        self.stream.flush()
+
+
+class CsvSink:
+    def __init__(self, field_names, stream=None, row_limit=None):
+        self.stream = stream or sys.stdout
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(field_names)
+
+    def add_row(self, row):
+        self.writer.writerow(row)
+
+    def add_rows(self, count, row):
+        self.writer.writerows(row(i) for i in range(count))
 
-def trapezoidal(x_0, x_1, f):
-    h = x_1 - x_0
-    approx = (h / 2) * (f(x_0) + f(x_1))
-    return approx
+    def close(self):
+        self.stream.flush()
 
 
-def error_trapezoidal(x_0, x_1, f_2_prime, num_points=100):
-    h = x_1 - x_0
-    x_values = np.linspace(x_0, x_1, num_points)
-    second_derivative_values = [abs(f_2_prime(x)) for x in x_values]
-    max_second_derivative = max(second_derivative_values)
-    error = abs((h ** 3 / 12) * max_second_derivative)
-    return error
+class JsonLinesSink:
+    def __init__(self, field_names, stream=None, row_limit=None):
+        self.stream = stream or sys.stdout
+        self.field_names = list(field_names)
 
+    def add_row(self, row):
+        values = [value.tolist() if isinstance(value, np.generic) else value for value in row]
+        self.stream.write(json.dumps(dict(zip(self.field_names, values)), default=str) + "\n")
+
+    def add_rows(self, count, row):
+        for i in range(count):
+            self.add_row(row(i))
+
+    def close(self):
+        self.stream.flush()
+
+
+RESULTS_SINKS = {
+    'table': TableSink,
+    'text': FixedWidthSink,
+    'csv': CsvSink,
+    'jsonl': JsonLinesSink,
+}
+
+
+def results_sink(field_names, format=None, stream=None, row_limit=None):
+    format = format or RESULTS_FORMAT
+    if row_limit is None and format in ['table', 'text']:
+        row_limit = RESULTS_ROW_LIMIT
+    return RESULTS_SINKS[format](field_names, stream, row_limit)
+
+
+def print_report(report, stream=None):
+    table = results_sink(["Stage", "Seconds", "Evaluations"], stream=stream)
+    for name, seconds in report['seconds'].items():
+        table.add_row([name, round(seconds, 6), report['evaluations'].get(name, "")])
+    table.close()
+
+
+# Derivatives
+
+@functools.lru_cache(maxsize=256)
+def derivative_expr(fn, x, order):
+    with stage('import'):
+        from sympy import diff
+
+    if order == 0:
+        return fn
+    return diff(derivative_expr(fn, x, order - 1), x)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_derivative(fn, x, order):
+    with stage('import'):
+        from sympy import lambdify
+
+    with stage('differentiate'):
+        expr = derivative_expr(fn, x, order)
+    with stage('compile'):
+        f_prime = lambdify(x, expr, cse=True)
+    f_prime.expr = expr
+    f_prime.symbol = x
+    return f_prime
+
+
+# Closed methods
 
 def table_trapezoidal(x_0, x_1, f, f_2_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = trapezoidal(x_0, x_1, f)
     error = error_trapezoidal(x_0, x_1, f_2_prime)
     table.add_row([x_0, x_1, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x_0 - 0.1
     x_max = x_1 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_2_prime(x) for x in xAxis], label="f''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Second derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def simpson(x_0, x_2, f):
-    x_1 = (x_0 + x_2) / 2
-    h = (x_2 - x_0) / 2
-    approx = (h / 3) * (f(x_0) + 4 * f(x_1) + f(x_2))
-    return approx
-
-
-def error_simpson(x_0, x_2, f_4_prime, num_points=100):
-    h = (x_2 - x_0) / 2
-    x_values = np.linspace(x_0, x_2, num_points)
-    fourth_derivative_values = [f_4_prime(x) for x in x_values]
-    max_fourth_derivative = max(fourth_derivative_values)
-    error = abs((h ** 5 / 90) * max_fourth_derivative)
-    return error
+    plot_derivative(f_2_prime, x_min, x_max, "f''(x)", "Second derivative")
 
 
 def table_simpson(x_0, x_2, f, f_4_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = simpson(x_0, x_2, f)
     error = error_simpson(x_0, x_2, f_4_prime)
     table.add_row([x_0, x_2, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x_0 - 0.1
     x_max = x_2 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [abs(f_4_prime(x)) for x in xAxis], label="f''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Fourth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def simpson_three_eighths(x_0, x_3, f):
-    h = (x_3 - x_0) / 3
-    x_1 = x_0 + h
-    x_2 = x_0 + 2 * h
-    approx = (h * 3 / 8) * (f(x_0) + 3 * f(x_1) + 3 * f(x_2) + f(x_3))
-    return approx
-
-
-def error_simpson_three_eighths(x_0, x_3, f_4_prime, num_points=100):
-    h = (x_3 - x_0) / 3
-    x_values = np.linspace(x_0, x_3, num_points)
-    fourth_derivative_values = [abs(f_4_prime(x)) for x in x_values]
-    max_fourth_derivative = max(fourth_derivative_values)
-    error = abs((h ** 5 * (3 / 80)) * max_fourth_derivative)
-    return error
+    plot_derivative(lambda x: abs(f_4_prime(x)), x_min, x_max, "f''''(x)", "Fourth derivative")
 
 
 def table_simpson_three_eighths(x_0, x_3, f, f_4_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = simpson(x_0, x_3, f)
     error = error_simpson(x_0, x_3, f_4_prime)
     table.add_row([x_0, x_3, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x_0 - 0.1
     x_max = x_3 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_4_prime(x) for x in xAxis], label="f''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Fourth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def closed_newton_four(x_0, x_4, f):
-    h = (x_4 - x_0) / 4
-    x_1 = x_0 + h
-    x_2 = x_0 + 2 * h
-    x_3 = x_0 + 3 * h
-    approx = (h * 2 / 45) * (7 * f(x_0) + 32 * f(x_1) + 12 * f(x_2) + + 32 * f(x_3) + 7 * f(x_4))
-    return approx
-
-
-def error_closed_newton_four(x_0, x_4, f_6_prime, num_points=100):
-    h = (x_4 - x_0) / 4
-    x_values = np.linspace(x_0, x_4, num_points)
-    sixth_derivative_values = [abs(f_6_prime(x)) for x in x_values]
-    max_sixth_derivative = max(sixth_derivative_values)
-    error = abs((h ** 7 * (8 / 945)) * max_sixth_derivative)
-    return error
+    plot_derivative(f_4_prime, x_min, x_max, "f''''(x)", "Fourth derivative")
 
 
 def table_closed_newton_four(x_0, x_4, f, f_6_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = simpson(x_0, x_4, f)
     error = error_simpson(x_0, x_4, f_6_prime)
     table.add_row([x_0, x_4, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x_0 - 0.1
     x_max = x_4 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_6_prime(x) for x in xAxis], label="f''''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Sixth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
+    plot_derivative(f_6_prime, x_min, x_max, "f''''''(x)", "Sixth derivative")
 
 
 # Open methods
 
-
-def open_newton_zero(x__1, x_1, f):
-    h = (x_1 - x__1) / 2
-    x_0 = (x__1 + x_1) / 2
-    approx = 2 * h * f(x_0)
-    return approx
-
-
-def error_open_newton_zero(x__1, x_1, f_2_prime, num_points=100):
-    h = (x_1 - x__1) / 2
-    x_values = np.linspace(x__1, x_1, num_points)
-    second_derivative_values = [abs(f_2_prime(x)) for x in x_values]
-    max_second_derivative = max(second_derivative_values)
-    error = abs((h ** 3 / 3) * max_second_derivative)
-    return error
-
-
 def table_open_newton_zero(x__1, x_1, f, f_2_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = open_newton_zero(x__1, x_1, f)
     error = error_open_newton_zero(x__1, x_1, f_2_prime)
     table.add_row([x__1, x_1, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x__1 - 0.1
     x_max = x_1 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_2_prime(x) for x in xAxis], label="f''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Second derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def open_newton_one(x__1, x_2, f):
-    h = (x_2 - x__1) / 3
-    x_0 = x__1 + h
-    x_1 = x__1 + 2 * h
-    approx = (h * 3 / 2) * (f(x_0) + f(x_1))
-    return approx
-
-
-def error_open_newton_one(x__1, x_2, f_2_prime, num_points=100):
-    h = (x_2 - x__1) / 3
-    x_values = np.linspace(x__1, x_2, num_points)
-    second_derivative_values = [abs(f_2_prime(x)) for x in x_values]
-    max_second_derivative = max(second_derivative_values)
-    error = abs((h ** 3 * (3 / 4)) * max_second_derivative)
-    return error
+    plot_derivative(f_2_prime, x_min, x_max, "f''(x)", "Second derivative")
 
 
 def table_open_newton_one(x__1, x_2, f, f_2_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = open_newton_one(x__1, x_2, f)
     error = error_open_newton_one(x__1, x_2, f_2_prime)
     table.add_row([x__1, x_2, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x__1 - 0.1
     x_max = x_2 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_2_prime(x) for x in xAxis], label="f''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Second derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def open_newton_two(x__1, x_3, f):
-    h = (x_3 - x__1) / 4
-    x_0 = x__1 + h
-    x_1 = x__1 + 2 * h
-    x_2 = x__1 + 3 * h
-    approx = (h * 4 / 3) * (2 * f(x_0) - f(x_1) + 2 * f(x_2))
-    return approx
-
-
-def error_open_newton_two(x__1, x_3, f_4_prime, num_points=100):
-    h = (x_3 - x__1) / 4
-    x_values = np.linspace(x__1, x_3, num_points)
-    fourth_derivative_values = [abs(f_4_prime(x)) for x in x_values]
-    max_fourth_derivative = max(fourth_derivative_values)
-    error = abs((h ** 5 * (14 / 45)) * max_fourth_derivative)
-    return error
+    plot_derivative(f_2_prime, x_min, x_max, "f''(x)", "Second derivative")
 
 
 def table_open_newton_two(x__1, x_3, f, f_4_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = open_newton_two(x__1, x_3, f)
     error = error_open_newton_two(x__1, x_3, f_4_prime)
     table.add_row([x__1, x_3, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x__1 - 0.1
     x_max = x_3 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_4_prime(x) for x in xAxis], label="f''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Fourth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def open_newton_three(x__1, x_4, f):
-    h = (x_4 - x__1) / 5
-    x_0 = x__1 + h
-    x_1 = x__1 + 2 * h
-    x_2 = x__1 + 3 * h
-    x_3 = x__1 + 4 * h
-    approx = (h * 5 / 24) * (11 * f(x_0) + f(x_1) + f(x_2) + 11 * f(x_3))
-    return approx
-
-
-def error_open_newton_three(x__1, x_4, f_4_prime, num_points=100):
-    h = (x_4 - x__1) / 5
-    x_values = np.linspace(x__1, x_4, num_points)
-    fourth_derivative_values = [abs(f_4_prime(x)) for x in x_values]
-    max_fourth_derivative = max(fourth_derivative_values)
-    error = abs((h ** 5 * (95 / 144)) * max_fourth_derivative)
-    return error
+    plot_derivative(f_4_prime, x_min, x_max, "f''''(x)", "Fourth derivative")
 
 
 def table_open_newton_three(x__1, x_4, f, f_4_prime):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = open_newton_three(x__1, x_4, f)
     error = error_open_newton_three(x__1, x_4, f_4_prime)
     table.add_row([x__1, x_4, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = x__1 - 0.1
     x_max = x_4 + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_4_prime(x) for x in xAxis], label="f''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
+    plot_derivative(f_4_prime, x_min, x_max, "f''''(x)", "Fourth derivative")
+
+
+# Gaussian methods
+
+def gauss_legendre_estimate(a, b, f, order):
+    approx = gauss_legendre(a, b, f, order)
+    return approx, abs(approx - gauss_legendre(a, b, f, 2 * order))
+
+
+def table_gauss_legendre(a, b, f, order):
+    table = results_sink(["a", "b", "Order", "Approx", "Error"])
+
+    approx, error = gauss_legendre_estimate(a, b, f, order)
+    table.add_row([a, b, order, approx, error])
+
+    table.close()
+
+
+def table_gauss_kronrod(a, b, f):
+    table = results_sink(["a", "b", "Approx", "Error"])
+
+    approx, error = gauss_kronrod(a, b, f)
+    table.add_row([a, b, approx, error])
+
+    table.close()
 
-    plt.title("Fourth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
+
+def table_clenshaw_curtis(a, b, f, tol):
+    approx, error, levels, evaluations = clenshaw_curtis(a, b, f, tol)
+
+    table = results_sink(["n", "Approx", "Difference"])
+    for k, (n, level) in enumerate(levels):
+        table.add_row([n, level, abs(level - levels[k - 1][1]) if k else ""])
+
+    table.close()
+
+    table = results_sink(["a", "b", "Approx", "Error", "Evaluations"])
+    table.add_row([a, b, approx, error, evaluations])
+
+    table.close()
+
+
+def table_node_caches(caches):
+    table = results_sink(["Function", "Evaluations", "Cache hits"])
+    for name, cache in caches.items():
+        table.add_row([name, cache.misses, cache.hits])
+    table.close()
 
 
 def table_all_simple_methods(a, b, f, f_2_prime, f_4_prime, f_6_prime):
-    table = PrettyTable()
-    table.field_names = ["Method", "a", "b", "Approx", "Error"]
+    caches = {"f(x)": NodeCache(f), "f''(x)": NodeCache(f_2_prime),
+              "f''''(x)": NodeCache(f_4_prime), "f''''''(x)": NodeCache(f_6_prime)}
+    f, f_2_prime, f_4_prime, f_6_prime = caches.values()
+    table = results_sink(["Method", "a", "b", "Approx", "Error"])
 
     approx = trapezoidal(a, b, f)
     error = error_trapezoidal(a, b, f_2_prime)
@@ -387,119 +467,73 @@ def table_all_simple_methods(a, b, f, f_2_prime, f_4_prime, f_6_prime):
     error = error_open_newton_three(a, b, f_4_prime)
     table.add_row(["Open Newton-Cotes (n=3)", a, b, approx, error])
 
-    print(table)
+    approx = gauss_legendre(a, b, f, 2)
+    error = error_gauss_legendre(a, b, f_4_prime, 2)
+    table.add_row(["Gauss-Legendre (n=2)", a, b, approx, error])
 
+    approx = gauss_legendre(a, b, f, 3)
+    error = error_gauss_legendre(a, b, f_6_prime, 3)
+    table.add_row(["Gauss-Legendre (n=3)", a, b, approx, error])
 
-# Composite methods
+    approx, error = gauss_kronrod(a, b, f)
+    table.add_row(["Gauss-Kronrod (7-15)", a, b, approx, error])
 
-def composite_trapezoidal(a, b, f, n):
-    h = (b - a) / n
-    x = np.linspace(a, b, n + 1)
-    approx = f(a) + f(b)
+    approx, error = clenshaw_curtis(a, b, f, n=8)[:2]
+    table.add_row(["Clenshaw-Curtis (n=8)", a, b, approx, error])
 
-    for i in range(1, n):
-        approx += 2 * f(x[i])
+    table.close()
 
-    approx *= h / 2
-    return approx
+    table_node_caches(caches)
 
 
-def error_composite_trapezoidal(a, b, f_2_prime, n, num_points=100):
-    h = (b - a) / n
-    x_values = np.linspace(a, b, num_points)
-    second_derivative_values = [abs(f_2_prime(x)) for x in x_values]
-    max_second_derivative = max(second_derivative_values)
-    error = abs((1 / 12) * ((b - a) * (h ** 2)) * max_second_derivative)
-    return error
-
+# Composite methods
 
 def table_composite_trapezoidal(a, b, f, f_2_prime, n):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = composite_trapezoidal(a, b, f, n)
     error = error_composite_trapezoidal(a, b, f_2_prime, n)
     table.add_row([a, b, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = a - 0.1
     x_max = b + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_2_prime(x) for x in xAxis], label="f''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
-
-    plt.title("Second derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
-
-
-def composite_simpsom(a, b, f, n):
-    if n % 2 != 0:
-        print("n must be an even number")
-        return None
-
-    h = (b - a) / n
-    x = np.linspace(a, b, n + 1)
-    approx = f(a) + f(b)
-
-    for i in range(1, n):
-        if i % 2 == 0:
-            approx += 2 * f(x[i])
-        else:
-            approx += 4 * f(x[i])
-
-    approx *= h / 3
-    return approx
-
-
-def error_composite_simpsom(a, b, f_4_prime, n, num_points=100):
-    if n % 2 != 0:
-        print("n must be an even number")
-        return None
-
-    h = (b - a) / n
-    x_values = np.linspace(a, b, num_points)
-    fourth_derivative_values = [abs(f_4_prime(x)) for x in x_values]
-    max_fourth_derivative = max(fourth_derivative_values)
-    error = abs((1 / 180) * ((b - a) * (h ** 4)) * max_fourth_derivative)
-    return error
+    plot_derivative(f_2_prime, x_min, x_max, "f''(x)", "Second derivative")
 
 
 def table_composite_simpsom(a, b, f, f_4_prime, n):
-    table = PrettyTable()
-    table.field_names = ["a", "b", "Approx", "Error"]
+    table = results_sink(["a", "b", "Approx", "Error"])
 
     approx = composite_simpsom(a, b, f, n)
     error = error_composite_simpsom(a, b, f_4_prime, n)
     table.add_row([a, b, approx, error])
 
-    print(table)
+    table.close()
 
     x_min = a - 0.1
     x_max = b + 0.1
-    xAxis = np.linspace(x_min, x_max, 100)
-    plt.plot(xAxis, [f_4_prime(x) for x in xAxis], label="f''''(x)")
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
+    plot_derivative(f_4_prime, x_min, x_max, "f''''(x)", "Fourth derivative")
 
-    plt.title("Fourth derivative")
-    plt.xlabel("x")
-    plt.ylabel("f''''(x)")
-    plt.grid(True, which='both')
-    plt.xlim(x_min, x_max)
-    plt.legend()
-    plt.show()
+
+def table_composite_tolerance(a, b, f, f_2_prime, f_4_prime, tol, rules):
+    table = results_sink(["Method", "a", "b", "n", "Approx", "Error bound", "Evaluations"])
+
+    names = {'trapezoidal': "Composite Trapezoidal Rule", 'simpson': "Composite Simpson's Rule"}
+    derivatives = {'trapezoidal': f_2_prime, 'simpson': f_4_prime}
+    for rule in rules:
+        result = composite_tolerance(a, b, f, derivatives[rule], tol, rule)
+        if result is not None:
+            approx, error, n, evaluations = result
+            table.add_row([names[rule], a, b, n, approx, error, evaluations])
+
+    table.close()
 
 
 def table_all_composite_methods(a, b, f, f_2_prime, f_4_prime, n):
-    table = PrettyTable()
-    table.field_names = ["Method", "a", "b", "Approx", "Error"]
+    caches = {"f(x)": NodeCache(f), "f''(x)": NodeCache(f_2_prime), "f''''(x)": NodeCache(f_4_prime)}
+    f, f_2_prime, f_4_prime = caches.values()
+    table = results_sink(["Method", "a", "b", "Approx", "Error"])
 
     approx = composite_trapezoidal(a, b, f, n)
     error = error_composite_trapezoidal(a, b, f_2_prime, n)
@@ -509,101 +543,539 @@ def table_all_composite_methods(a, b, f, f_2_prime, f_4_prime, n):
     error = error_composite_simpsom(a, b, f_4_prime, n)
     table.add_row(["Composite Simpson's Rule", a, b, approx, error])
 
-    print(table)
+    table.close()
 
+    table_node_caches(caches)
 
-def euler(f, equation_name, a, b, y0, n):
-    h = (b - a) / n
-    x = a
-    y = y0
-    x_values = [x]
-    y_values = [y]
-    fxy = f(x, y)
-    t = PrettyTable(['n', 't', f'y(t) = y(t_i-1) + h * f(t_i-1, y_i-1)', f'f(t, y) = {equation_name}'])
-    t.add_row([0, x, y, fxy])
-
-    for i in range(1, n + 1):
-        y = y + h * f(x, y)
-        x = a + i * h
-        x_values.append(x)
-        y_values.append(y)
-
-        if i != n:
-            fxy = f(x, y)
+
+# Adaptive methods
+
+def table_adaptive_quadrature(a, b, f, tol, rule='simpson'):
+    table = results_sink(["a", "b", "Approx", "Error", "Evaluations"])
+
+    result = adaptive_quadrature(a, b, f, tol, rule=rule)
+    if result is None:
+        return
+    approx, error, evaluations = result
+    table.add_row([a, b, approx, error, evaluations])
+
+    table.close()
+
+
+def table_romberg(a, b, f, tol):
+    approx, error, tableau, evaluations = romberg(a, b, f, tol)
+
+    table = results_sink(["k", "h"] + [f"R(k, {j})" for j in range(len(tableau))])
+    for k, row in enumerate(tableau):
+        table.add_row([k, (b - a) / 2 ** k] + row + [""] * (len(tableau) - len(row)))
+
+    table.close()
+
+    table = results_sink(["a", "b", "Approx", "Error", "Evaluations"])
+    table.add_row([a, b, approx, error, evaluations])
+
+    table.close()
+
+
+def table_double_exponential(a, b, f, tol):
+    table = results_sink(["a", "b", "Approx", "Error", "Evaluations"])
+
+    approx, error, evaluations = double_exponential(a, b, f, tol)
+    table.add_row([a, b, approx, error, evaluations])
+
+    table.close()
+
+
+# Cubature
+
+CUBATURE_VARIABLES = 'x y z'
+
+
+def compile_cubature(fn, dimension):
+    with stage('import'):
+        from sympy import lambdify, symbols
+
+    variables = symbols(CUBATURE_VARIABLES)[:dimension]
+    with stage('compile'):
+        f = lambdify(variables, fn, 'numpy')
+    f.expr = fn
+    f.symbols = variables
+    return f
+
+
+CUBATURE_TITLES = {
+    'tensor_trapezoidal': "Tensor-product trapezoidal",
+    'tensor_simpson': "Tensor-product Simpson",
+    'sparse_grid': "Sparse grid (Smolyak, Clenshaw-Curtis)",
+    'quasi_monte_carlo': "Quasi-Monte Carlo (scrambled Sobol)",
+}
+
+
+def table_cubature(lower, upper, f, methods, n, level, tol):
+    table = results_sink(["Method", "n / level / tol", "Approx", "Error", "Evaluations"])
+
+    for method in methods:
+        if method == 'tensor_trapezoidal':
+            parameter, result = n, tensor_product(lower, upper, f, n, 'trapezoidal')
+        elif method == 'tensor_simpson':
+            parameter, result = n, tensor_product(lower, upper, f, n, 'simpson')
+        elif method == 'sparse_grid':
+            parameter, result = level, sparse_grid(lower, upper, f, level)
         else:
-            fxy = ' '
+            parameter, result = tol, quasi_monte_carlo(lower, upper, f, tol)
+        if result is None:
+            continue
+        approx, error, evaluations = result
+        table.add_row([CUBATURE_TITLES[method], parameter, approx, error, evaluations])
 
-        t.add_row([i, round(x, 4), y, fxy])
+    table.close()
 
-    print(t)
 
-    plt.plot(x_values, y_values, '-o', label='y(t)', markersize=5)
-    plt.axhline(color='black', linewidth=0.5)
-    plt.axvline(color='black', linewidth=0.5)
+# Differential equations
 
-    plt.title('Euler Method')
-    plt.xlabel('t')
-    plt.ylabel('y')
-    plt.grid(True, which='both')
-    plt.ylim(min(y_values) - 0.1, max(y_values) + 0.1)
-    plt.legend()
-    plt.show()
+def euler(f, equation_name, a, b, y0, n):
+    x_values, y_values = euler_method(f, a, b, y0, n)
+    t = results_sink(['n', 't', f'y(t) = y(t_i-1) + h * f(t_i-1, y_i-1)', f'f(t, y) = {equation_name}'])
+    ts = x_values.tolist()
+
+    def row(i):
+        x = ts[i] if i == 0 else round(ts[i], 4)
+        fxy = f(x_values[i], y_values[i]) if i != n else ' '
+        return [i, x, y_values[i], fxy]
+
+    t.add_rows(n + 1, row)
+    t.close()
+    y = y_values[n]
+
+    show_plot(x_values, y_values, ['y(t)'], 'Euler Method', 't', 'y', '-o',
+              ylim=(np.min(y_values) - 0.1, np.max(y_values) + 0.1))
 
     return y
 
 
+def table_ode_solution(title, equation_name, x_values, y_values, stats, names=None):
+    names = names or ['y']
+    columns = np.reshape(y_values, (len(x_values), -1))
+    t = results_sink(['n', 't'] + [f'{name}(t)' for name in names])
+    ts = np.asarray(x_values).tolist()
+    t.add_rows(len(ts), lambda i: [i, round(ts[i], 4)] + list(columns[i]))
+
+    t.close()
+
+    t = results_sink(['f(t, y)', 'Steps', 'Evaluations'])
+    t.add_row([equation_name, stats['steps'], stats['evaluations']])
+
+    t.close()
+
+    show_plot(x_values, columns, [f'{name}(t)' for name in names], title, 't', 'y', '-o',
+              ylim=(np.min(columns) - 0.1, np.max(columns) + 0.1))
+
+    return y_values[-1]
+
+
+def table_rk4(f, equation_name, a, b, y0, n):
+    x_values, y_values = rk4_method(f, a, b, y0, n)
+    stats = {'steps': n, 'evaluations': 4 * n}
+    return table_ode_solution('Runge-Kutta Method (RK4)', equation_name, x_values, y_values, stats)
+
+
+def table_dormand_prince(f, equation_name, a, b, y0, tol):
+    x_values, y_values, stats = dormand_prince(f, a, b, y0, rtol=tol, atol=tol)
+    return table_ode_solution('Dormand-Prince Method (RK45)', equation_name, x_values, y_values, stats)
+
+
+# Implicit methods
+
+@functools.lru_cache(maxsize=256)
+def compile_rhs(fn, t, y):
+    with stage('import'):
+        from sympy import lambdify
+
+    with stage('compile'):
+        f = lambdify((t, y), fn, 'numpy')
+    f.expr = fn
+    f.symbols = (t, y)
+    return f
+
+
+@functools.lru_cache(maxsize=256)
+def compile_system(exprs, t, ys):
+    with stage('import'):
+        from sympy import cse, numbered_symbols
+        from sympy.printing.numpy import NumPyPrinter
+
+    unknown = set().union(*(expr.free_symbols for expr in exprs)) - {t, *ys}
+    if unknown:
+        raise ValueError("unknown symbols: " + ", ".join(sorted(str(symbol) for symbol in unknown)))
+
+    # Generated names start with an underscore so they cannot shadow t or ys
+    replacements, reduced = cse(list(exprs), symbols=numbered_symbols('_cse'))
+    printer = NumPyPrinter()
+    lines = [
+        f"def _rhs({t}, _y, _out=None):",
+        "    if _out is None:",
+        "        _out = numpy.empty(numpy.shape(_y))",
+        f"    {', '.join(str(symbol) for symbol in ys)}, = _y",
+    ]
+    lines += [f"    {symbol} = {printer.doprint(value)}" for symbol, value in replacements]
+    lines += [f"    _out[{i}] = {printer.doprint(value)}" for i, value in enumerate(reduced)]
+    lines.append("    return _out")
+    source = "\n".join(lines) + "\n"
+
+    namespace = {module: importlib.import_module(module) for module in ['numpy', *printer.module_imports]}
+    with stage('compile'):
+        exec(source, namespace)
+    rhs = namespace['_rhs']
+    rhs.buffered = True
+    rhs.expr = tuple(exprs)
+    rhs.symbols = (t, tuple(ys))
+    rhs.source = source
+    return rhs
+
+
+def reduce_order(expr, ys):
+    return tuple(ys[1:]) + (expr,)
+
+
+@functools.lru_cache(maxsize=256)
+def ode_jacobian(f):
+    with stage('import'):
+        from sympy import Matrix, diff, lambdify
+
+    t, y = f.symbols
+    with stage('differentiate'):
+        expr = Matrix(f.expr).jacobian(y) if isinstance(y, tuple) else diff(f.expr, y)
+    with stage('compile'):
+        return lambdify((t, y), expr, 'numpy')
+
+
+def table_bdf(f, equation_name, a, b, y0, n, order, title):
+    result = bdf_method(f, ode_jacobian(f), a, b, y0, n, order)
+    if result is None:
+        return
+    x_values, y_values, stats = result
+    return table_ode_solution(title, equation_name, x_values, y_values, stats)
+
+
+ODE_TITLES = {
+    'euler': 'Euler Method',
+    'rk4': 'Runge-Kutta Method (RK4)',
+    'dormand_prince': 'Dormand-Prince Method (RK45)',
+    'backward_euler': 'Backward Euler Method',
+    'bdf2': 'BDF2 Method',
+    'bdf': 'BDF5 Method',
+}
+
+
+def table_ode_system(f, equation_name, a, b, y0, n, method, names):
+    result = ODE_METHODS[method](f, a, b, y0, n)
+    if result is None:
+        return
+    x_values, y_values, stats = result
+    return table_ode_solution(ODE_TITLES[method], equation_name, x_values, y_values, stats, names)
+
+
+# Programmatic API
+
+INTEGRATION_METHODS = {
+    'trapezoidal': lambda a, b, f, derivative, n: (
+        trapezoidal(a, b, f), error_trapezoidal(a, b, derivative(2))),
+    'simpson': lambda a, b, f, derivative, n: (
+        simpson(a, b, f), error_simpson(a, b, derivative(4))),
+    'simpson_three_eighths': lambda a, b, f, derivative, n: (
+        simpson_three_eighths(a, b, f), error_simpson_three_eighths(a, b, derivative(4))),
+    'closed_newton_four': lambda a, b, f, derivative, n: (
+        closed_newton_four(a, b, f), error_closed_newton_four(a, b, derivative(6))),
+    'open_newton_zero': lambda a, b, f, derivative, n: (
+        open_newton_zero(a, b, f), error_open_newton_zero(a, b, derivative(2))),
+    'open_newton_one': lambda a, b, f, derivative, n: (
+        open_newton_one(a, b, f), error_open_newton_one(a, b, derivative(2))),
+    'open_newton_two': lambda a, b, f, derivative, n: (
+        open_newton_two(a, b, f), error_open_newton_two(a, b, derivative(4))),
+    'open_newton_three': lambda a, b, f, derivative, n: (
+        open_newton_three(a, b, f), error_open_newton_three(a, b, derivative(4))),
+    'gauss_legendre': lambda a, b, f, derivative, n: gauss_legendre_estimate(a, b, f, n or 5),
+    'gauss_kronrod': lambda a, b, f, derivative, n: gauss_kronrod(a, b, f),
+    'clenshaw_curtis': lambda a, b, f, derivative, n: clenshaw_curtis(a, b, f, n=n)[:2],
+    'composite_trapezoidal': lambda a, b, f, derivative, n: (
+        composite_trapezoidal(a, b, f, n), error_composite_trapezoidal(a, b, derivative(2), n)),
+    'composite_simpsom': lambda a, b, f, derivative, n: (
+        composite_simpsom(a, b, f, n), error_composite_simpsom(a, b, derivative(4), n)),
+    'adaptive_simpson': lambda a, b, f, derivative, n: adaptive_quadrature(a, b, f)[:2],
+    'romberg': lambda a, b, f, derivative, n: romberg(a, b, f)[:2],
+    'double_exponential': lambda a, b, f, derivative, n: double_exponential(a, b, f)[:2],
+}
+
+
+def load_source(source):
+    namespace = {}
+    namespace.update(np.__dict__)
+    namespace.update(np.linalg.__dict__)
+    namespace.update({'numpy': np, 'I': 1j})
+    exec(source, namespace)
+    f = namespace['_lambdifygenerated']
+    if any(name not in namespace and not hasattr(builtins, name) for name in f.__code__.co_names):
+        return None
+    return f
+
+
+CUBATURE_METHODS = {
+    'tensor_trapezoidal': lambda lower, upper, f, n: tensor_product(lower, upper, f, n or 64, 'trapezoidal'),
+    'tensor_simpson': lambda lower, upper, f, n: tensor_product(lower, upper, f, n or 32, 'simpson'),
+    'sparse_grid': lambda lower, upper, f, n: sparse_grid(lower, upper, f, n or 6),
+    'quasi_monte_carlo': lambda lower, upper, f, n: quasi_monte_carlo(lower, upper, f, max_points=n or 2 ** 20,
+                                                                       seed=0),
+}
+
+
+ODE_METHODS = {
+    'euler': lambda f, a, b, y0, n: euler_method(f, a, b, y0, n) + ({'steps': n, 'evaluations': n},),
+    'rk4': lambda f, a, b, y0, n: rk4_method(f, a, b, y0, n) + ({'steps': n, 'evaluations': 4 * n},),
+    'dormand_prince': lambda f, a, b, y0, n: dormand_prince(f, a, b, y0, h=(b - a) / n if n else None),
+    'backward_euler': lambda f, a, b, y0, n: bdf_method(f, ode_jacobian(f), a, b, y0, n, order=1),
+    'bdf2': lambda f, a, b, y0, n: bdf_method(f, ode_jacobian(f), a, b, y0, n, order=2),
+    'bdf': lambda f, a, b, y0, n: bdf_method(f, ode_jacobian(f), a, b, y0, n),
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def cached_integrand(text, order=0, cache=None):
+    with stage('import'):
+        from sympy import srepr, symbols, sympify
+
+    alias_key = make_key('alias', ' '.join(text.split()))
+
+    if cache is not None:
+        canonical = cache.get(alias_key)
+        if canonical is not None:
+            source = cache.get(make_key('source', canonical, order))
+            with stage('compile'):
+                f = load_source(source) if source is not None else None
+            if f is not None:
+                return canonical, f
+
+    with stage('parse'):
+        fn = sympify(text)
+        canonical = srepr(fn)
+    f = compile_derivative(fn, symbols('x'), order)
+
+    if cache is not None:
+        cache.put(alias_key, canonical)
+        cache.put(make_key('source', canonical, order), inspect.getsource(f))
+
+    return canonical, f
+
+
+def integrate_expression(text, method, a, b, n=None, cache=None, profile=False):
+    if method not in INTEGRATION_METHODS:
+        raise ValueError("method must be one of: " + ", ".join(INTEGRATION_METHODS))
+    if not (np.isfinite(a) and np.isfinite(b)) and method != 'double_exponential':
+        raise ValueError("an infinite interval needs method double_exponential")
+
+    if profile:
+        with profiling() as report:
+            result = integrate_expression(text, method, a, b, n, cache)
+        return dict(result, report=report.as_dict())
+
+    canonical = None
+    if cache is not None:
+        with stage('cache'):
+            canonical = cache.get(make_key('alias', ' '.join(text.split())))
+            result = cache.get(make_key('result', canonical, method, a, b, n)) if canonical is not None else None
+        if result is not None:
+            return result
+
+    canonical, f = cached_integrand(text, 0, cache)
+    f = counted('f', f)
+    derivative = lambda order: counted('f' + "'" * order, cached_integrand(text, order, cache)[1])
+    with stage('integrate'):
+        approx, error = INTEGRATION_METHODS[method](a, b, f, derivative, n)
+    result = {'approx': float(approx), 'error': None if error is None else float(error)}
+
+    if cache is not None:
+        cache.put(make_key('result', canonical, method, a, b, n), result)
+
+    return result
+
+
+@functools.lru_cache(maxsize=1024)
+def cached_cubature(text, dimension):
+    with stage('import'):
+        from sympy import sympify
+
+    with stage('parse'):
+        fn = sympify(text)
+    return compile_cubature(fn, dimension)
+
+
+def cubature_expression(text, method, lower, upper, n=None, profile=False):
+    if method not in CUBATURE_METHODS:
+        raise ValueError("method must be one of: " + ", ".join(CUBATURE_METHODS))
+    if len(lower) != len(upper) or not 1 <= len(lower) <= 3:
+        raise ValueError("lower and upper must both list the limits of x, y[, z]")
+
+    if profile:
+        with profiling() as report:
+            result = cubature_expression(text, method, lower, upper, n)
+        return dict(result, report=report.as_dict())
+
+    f = cached_cubature(text, len(lower))
+    with stage('integrate'):
+        result = CUBATURE_METHODS[method](lower, upper, counted('f', f), n)
+    if result is None:
+        raise ValueError(f"invalid arguments for {method}")
+    approx, error, evaluations = result
+    return {'approx': float(approx), 'error': None if error is None else float(error), 'evaluations': evaluations}
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_ode(text):
+    with stage('import'):
+        from sympy import symbols, sympify
+
+    t, y = symbols('t y')
+    with stage('parse'):
+        fn = sympify(text)
+    return compile_rhs(fn, t, y)
+
+
+def solve_ode_ensemble(text, a, b, y0, n, parameters=None):
+    with stage('import'):
+        from sympy import Symbol, lambdify, symbols, sympify
+
+    parameters = parameters or {}
+    t, y = symbols('t y')
+    names = [Symbol(name) for name in parameters]
+    f = lambdify((t, y, *names), sympify(text), 'numpy')
+    return euler_ensemble(f, a, b, y0, n, list(parameters.values()))
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_ode_system(texts):
+    with stage('import'):
+        from sympy import Symbol, symbols, sympify
+
+    t = Symbol('t')
+    ys = symbols(f'y1:{len(texts) + 1}')
+    with stage('parse'):
+        fns = tuple(sympify(text) for text in texts)
+    return compile_system(fns, t, ys)
+
+
+def solve_ode_expression(text, method, a, b, y0, n, profile=False):
+    if method not in ODE_METHODS:
+        raise ValueError("method must be one of: " + ", ".join(ODE_METHODS))
+
+    if profile:
+        with profiling() as report:
+            result = solve_ode_expression(text, method, a, b, y0, n)
+        return dict(result, report=report.as_dict())
+
+    if isinstance(text, (list, tuple)):
+        f = compile_ode_system(tuple(text))
+    else:
+        f = compile_ode(text)
+
+    with stage('solve'):
+        result = ODE_METHODS[method](counted('f', f), a, b, y0, n)
+    if result is None:
+        raise ValueError(f"{method} did not converge")
+    x_values, y_values, stats = result
+    return {'approx': np.asarray(y_values[-1]).tolist(), 'error': None,
+            'steps': stats['steps'], 'evaluations': stats['evaluations']}
+
+
+def stream_ode_expression(text, method, a, b, y0, n, path, stride=1, chunk_size=65536, profile=False):
+    if method not in STREAM_STEPPERS:
+        raise ValueError("method must be one of: " + ", ".join(STREAM_STEPPERS))
+
+    if profile:
+        with profiling() as report:
+            result = stream_ode_expression(text, method, a, b, y0, n, path, stride, chunk_size)
+        return dict(result, report=report.as_dict())
+
+    if isinstance(text, (list, tuple)):
+        f = compile_ode_system(tuple(text))
+    else:
+        f = compile_ode(text)
+
+    sink = trajectory_sink(path, n, y0, stride)
+    with stage('solve'):
+        y = stream_trajectory(STREAM_STEPPERS[method], counted('f', f), a, b, y0, n, sink, stride, chunk_size)
+    return {'approx': np.asarray(y).tolist(), 'error': None,
+            'steps': n, 'evaluations': n * (4 if method == 'rk4' else 1)}
+
+
+def parse_number(value):
+    value = str(value).strip()
+    if value.lstrip('+-') in ['oo', 'inf', 'infinity']:
+        return float('-inf') if value.startswith('-') else float('inf')
+    if 'pi' in value:
+        k = value.split('*')[0].strip()
+        return (1.0 if k == 'pi' else float(k)) * np.pi
+    return float(value)
+
+
 def get_input(prompt):
     while True:
         value = input(prompt)
-        if 'pi' in value:
-            try:
-                k = float(value.split('*')[0].strip())
-                return k * np.pi
-            except ValueError:
-                print("Invalid input. Please enter a numeric value or a multiple of pi (e.g., '0.5', '2*pi').")
-        else:
-            try:
-                return float(value)
-            except ValueError:
-                print("Invalid input. Please enter a numeric value or a multiple of pi (e.g., '0.5', '2*pi').")
+        try:
+            return parse_number(value)
+        except ValueError:
+            print("Invalid input. Please enter a numeric value, a multiple of pi or oo (e.g., '0.5', '2*pi', '-oo').")
 
 
 def main():
-    x = symbols('x')
-
     while True:
         print("\nSelect the procedure you'd like to do: ")
         print("1. Approximate the integral of a function")
         print("2. Approximate an differential equation")
-        print("3. Exit")
+        print("3. Approximate a system or a higher-order differential equation")
+        print("4. Approximate a double or triple integral over a box")
+        print("5. Exit")
 
         choice = input("Enter your choice: ")
 
         if choice == '1':
 
             equation_name = input('\nEnter the function: ')
+            from sympy import symbols, sympify
+            x = symbols('x')
             try:
-                func = sympify(equation_name)
+                with stage('parse'):
+                    func = sympify(equation_name)
                 fn = func
             except Exception as e:
                 print("Error defining the function: ", e)
                 exit()
 
-            f = lambdify(x, fn)
-            f_2_prime = lambdify(x, diff(fn, x, x))
-            f_4_prime = lambdify(x, diff(fn, x, x, x, x))
-            f_6_prime = lambdify(x, diff(fn, x, x, x, x, x, x))
+            f = counted('f', compile_derivative(fn, x, 0))
+            derivative = lambda order: counted('f' + "'" * order, compile_derivative(fn, x, order))
 
             print("Input the limits of integration for the function f(x):")
 
             a = get_input("Enter the lower limit a: ")
             b = get_input("Enter the upper limit b: ")
+            if not (np.isfinite(a) and np.isfinite(b)):
+                print("The interval is infinite: only the double exponential method applies.")
+                while True:
+                    try:
+                        tol = float(input("Enter the tolerance (e.g., 1e-8): "))
+                        if tol > 0:
+                            break
+                        else:
+                            print("Please enter a positive tolerance.")
+                    except ValueError:
+                        print("Please enter a valid number for the tolerance.")
+                table_double_exponential(a, b, f, tol)
+                continue
 
             while True:
                 print("\nSelect a type of method to approximate the integral:")
                 print("1. Simple")
                 print("2. Compose")
-                print("3. Exit")
+                print("3. Adaptive")
+                print("4. Exit")
 
                 choice2 = input("Enter your choice: ")
 
@@ -612,11 +1084,12 @@ def main():
                         print("\nSelect the type of simple method:")
                         print("1. Closed")
                         print("2. Open")
-                        print("3. All simple methods")
+                        print("3. Gaussian and Clenshaw-Curtis")
+                        print("4. All simple methods")
 
                         choice3 = input("Enter your choice: ")
 
-                        if choice3 in ['1', '2', '3']:
+                        if choice3 in ['1', '2', '3', '4']:
                             break
                         else:
                             print("Invalid choice. Please enter a valid option.")
@@ -637,13 +1110,13 @@ def main():
                                 print("Invalid choice. Please enter a valid option.")
 
                         if choice4 == '1':
-                            table_trapezoidal(a, b, f, f_2_prime)
+                            table_trapezoidal(a, b, f, derivative(2))
                         elif choice4 == '2':
-                            table_simpson(a, b, f, f_4_prime)
+                            table_simpson(a, b, f, derivative(4))
                         elif choice4 == '3':
-                            table_simpson_three_eighths(a, b, f, f_4_prime)
+                            table_simpson_three_eighths(a, b, f, derivative(4))
                         elif choice4 == '4':
-                            table_closed_newton_four(a, b, f, f_6_prime)
+                            table_closed_newton_four(a, b, f, derivative(6))
 
                     elif choice3 == '2':
                         while True:
@@ -661,28 +1134,78 @@ def main():
                                 print("Invalid choice. Please enter a valid option.")
 
                         if choice4 == '1':
-                            table_open_newton_zero(a, b, f, f_2_prime)
+                            table_open_newton_zero(a, b, f, derivative(2))
                         elif choice4 == '2':
-                            table_open_newton_one(a, b, f, f_2_prime)
+                            table_open_newton_one(a, b, f, derivative(2))
                         elif choice4 == '3':
-                            table_open_newton_two(a, b, f, f_4_prime)
+                            table_open_newton_two(a, b, f, derivative(4))
                         elif choice4 == '4':
-                            table_open_newton_three(a, b, f, f_4_prime)
+                            table_open_newton_three(a, b, f, derivative(4))
 
                     elif choice3 == '3':
-                        table_all_simple_methods(a, b, f, f_2_prime, f_4_prime, f_6_prime)
+                        while True:
+                            print("\nSelect a method to approximate the integral:")
+                            print("1. Gauss-Legendre")
+                            print("2. Gauss-Kronrod (7-15)")
+                            print("3. Clenshaw-Curtis (nested Chebyshev nodes)")
+
+                            choice4 = input("Enter your choice: ")
+
+                            if choice4 in ['1', '2', '3']:
+                                break
+                            else:
+                                print("Invalid choice. Please enter a valid option.")
+
+                        if choice4 == '1':
+                            while True:
+                                try:
+                                    order = int(input("Enter the number of nodes: "))
+                                    if order > 0:
+                                        break
+                                    else:
+                                        print("Please enter a positive number of nodes.")
+                                except ValueError:
+                                    print("Please enter a valid integer for the number of nodes.")
+                            table_gauss_legendre(a, b, f, order)
+                        elif choice4 == '2':
+                            table_gauss_kronrod(a, b, f)
+                        elif choice4 == '3':
+                            while True:
+                                try:
+                                    tol = float(input("Enter the tolerance (e.g., 1e-12): "))
+                                    if tol > 0:
+                                        break
+                                    else:
+                                        print("Please enter a positive tolerance.")
+                                except ValueError:
+                                    print("Please enter a valid number for the tolerance.")
+                            table_clenshaw_curtis(a, b, f, tol)
+
+                    elif choice3 == '4':
+                        table_all_simple_methods(a, b, f, derivative(2), derivative(4), derivative(6))
 
                 elif choice2 == '2':
                     while True:
                         try:
-                            n = int(input("Enter the number of sub-intervals n (even number): "))
-                            if n % 2 == 0:
+                            n = int(input("Enter the number of sub-intervals n (even number, "
+                                          "or 0 to choose n from a tolerance): "))
+                            if n % 2 == 0 and n >= 0:
                                 break
                             else:
                                 print("Please enter an even number for the number of sub-intervals.")
                         except ValueError:
                             print("Please enter a valid integer for the number of sub-intervals.")
 
+                    while n == 0:
+                        try:
+                            tol = float(input("Enter the tolerance for the error bound (e.g., 1e-8): "))
+                            if tol > 0:
+                                break
+                            else:
+                                print("Please enter a positive tolerance.")
+                        except ValueError:
+                            print("Please enter a valid number for the tolerance.")
+
                     while True:
                         print("\nSelect the type of composite method:")
                         print("1. Composite Trapezoidal Rule")
@@ -696,38 +1219,258 @@ def main():
                         else:
                             print("Invalid choice. Please enter a valid option.")
 
+                    if n == 0:
+                        rules = {'1': ['trapezoidal'], '2': ['simpson'], '3': ['trapezoidal', 'simpson']}[choice3]
+                        table_composite_tolerance(a, b, f, derivative(2), derivative(4), tol, rules)
+                    elif choice3 == '1':
+                        table_composite_trapezoidal(a, b, f, derivative(2), n)
+                    elif choice3 == '2':
+                        table_composite_simpsom(a, b, f, derivative(4), n)
+                    elif choice3 == '3':
+                        table_all_composite_methods(a, b, f, derivative(2), derivative(4), n)
+
+                elif choice2 == '3':
+                    while True:
+                        try:
+                            tol = float(input("Enter the tolerance (e.g., 1e-8): "))
+                            if tol > 0:
+                                break
+                            else:
+                                print("Please enter a positive tolerance.")
+                        except ValueError:
+                            print("Please enter a valid number for the tolerance.")
+
+                    while True:
+                        print("\nSelect the adaptive method:")
+                        print("1. Adaptive Simpson")
+                        print("2. Adaptive Simpson's 3/8 Rule")
+                        print("3. Adaptive Closed Newton-Cotes (n=4)")
+                        print("4. Romberg")
+                        print("5. Double exponential (tanh-sinh, exp-sinh, sinh-sinh)")
+
+                        choice3 = input("Enter your choice: ")
+
+                        if choice3 in ['1', '2', '3', '4', '5']:
+                            break
+                        else:
+                            print("Invalid choice. Please enter a valid option.")
+
                     if choice3 == '1':
-                        table_composite_trapezoidal(a, b, f, f_2_prime, n)
+                        table_adaptive_quadrature(a, b, f, tol, 'simpson')
                     if choice3 == '2':
-                        table_composite_simpsom(a, b, f, f_4_prime, n)
+                        table_adaptive_quadrature(a, b, f, tol, 'simpson_three_eighths')
                     if choice3 == '3':
-                        table_all_composite_methods(a, b, f, f_2_prime, f_4_prime, n)
+                        table_adaptive_quadrature(a, b, f, tol, 'closed_newton_four')
+                    if choice3 == '4':
+                        table_romberg(a, b, f, tol)
+                    if choice3 == '5':
+                        table_double_exponential(a, b, f, tol)
 
-                elif choice2 == '3':
+                elif choice2 == '4':
                     print("Exiting program...")
                     break
                 else:
                     print("Invalid choice. Please enter a valid option.")
                     continue
         elif choice == '2':
+            from sympy import Symbol, sympify
             t = Symbol('t')
             y = Symbol('y')
             equation_name = input("\nEnter the function of the form y' = f(t, y): ")
             try:
-                func = sympify(equation_name)
+                with stage('parse'):
+                    func = sympify(equation_name)
                 fn = func
             except Exception as e:
                 print("Error defining the function: ", e)
                 exit()
 
-            f = lambdify((t, y), fn, 'numpy')
+            f = counted('f', compile_rhs(fn, t, y))
 
             a = get_input('Enter the initial value of t: ')
             b = get_input('Enter the final value of t: ')
             y0 = get_input('Enter the initial value of y: ')
-            n = int(input('Enter the number of iterations: '))
-            euler(f, equation_name, a, b, y0, n)
+
+            while True:
+                print("\nSelect a method to approximate the differential equation:")
+                print("1. Euler")
+                print("2. Runge-Kutta (RK4)")
+                print("3. Dormand-Prince (RK45, adaptive step)")
+                print("4. Backward Euler (stiff)")
+                print("5. BDF2 (stiff)")
+                print("6. BDF5 (stiff)")
+
+                choice2 = input("Enter your choice: ")
+
+                if choice2 in ['1', '2', '3', '4', '5', '6']:
+                    break
+                else:
+                    print("Invalid choice. Please enter a valid option.")
+
+            if choice2 in ['1', '2', '4', '5', '6']:
+                n = int(input('Enter the number of iterations: '))
+                if choice2 == '1':
+                    euler(f, equation_name, a, b, y0, n)
+                elif choice2 == '2':
+                    table_rk4(f, equation_name, a, b, y0, n)
+                elif choice2 == '4':
+                    table_bdf(f, equation_name, a, b, y0, n, 1, 'Backward Euler Method')
+                elif choice2 == '5':
+                    table_bdf(f, equation_name, a, b, y0, n, 2, 'BDF2 Method')
+                elif choice2 == '6':
+                    table_bdf(f, equation_name, a, b, y0, n, 5, 'BDF5 Method')
+            elif choice2 == '3':
+                tol = float(input('Enter the tolerance (e.g., 1e-6): '))
+                table_dormand_prince(f, equation_name, a, b, y0, tol)
         elif choice == '3':
+            while True:
+                print("\nSelect the type of equation:")
+                print("1. System of first-order equations y_i' = f_i(t, y1, ..., ym)")
+                print("2. Higher-order equation y^(m) = f(t, y0, ..., y(m-1)), where y0 = y, y1 = y', ...")
+
+                choice2 = input("Enter your choice: ")
+
+                if choice2 in ['1', '2']:
+                    break
+                else:
+                    print("Invalid choice. Please enter a valid option.")
+
+            while True:
+                try:
+                    m = int(input("Enter the number of equations (or the order m): "))
+                    if m > 0:
+                        break
+                    else:
+                        print("Please enter a positive integer.")
+                except ValueError:
+                    print("Please enter a valid integer.")
+
+            from sympy import Symbol, symbols, sympify
+            t = Symbol('t')
+            try:
+                if choice2 == '1':
+                    ys = symbols(f'y1:{m + 1}')
+                    equations = [input(f"Enter {y}' = ") for y in ys]
+                    fns = tuple(sympify(equation) for equation in equations)
+                    equation_name = ', '.join(equations)
+                    names = [str(y) for y in ys]
+                else:
+                    ys = symbols(f'y0:{m}')
+                    equation_name = input(f"Enter y^({m}) = ")
+                    fns = reduce_order(sympify(equation_name), ys)
+                    names = ['y'] + ["y" + "'" * i for i in range(1, m)]
+                f = counted('f', compile_system(fns, t, tuple(ys)))
+            except Exception as e:
+                print("Error defining the function: ", e)
+                exit()
+
+            a = get_input('Enter the initial value of t: ')
+            b = get_input('Enter the final value of t: ')
+            y0 = [get_input(f'Enter the initial value of {name}: ') for name in names]
+
+            while True:
+                print("\nSelect a method to approximate the system:")
+                for i, method in enumerate(ODE_TITLES, start=1):
+                    print(f"{i}. {ODE_TITLES[method]}")
+
+                choice3 = input("Enter your choice: ")
+
+                if choice3 in [str(i) for i in range(1, len(ODE_TITLES) + 1)]:
+                    break
+                else:
+                    print("Invalid choice. Please enter a valid option.")
+
+            method = list(ODE_TITLES)[int(choice3) - 1]
+            if method == 'dormand_prince':
+                tol = float(input('Enter the tolerance (e.g., 1e-6): '))
+                x_values, y_values, stats = dormand_prince(f, a, b, y0, rtol=tol, atol=tol)
+                table_ode_solution(ODE_TITLES[method], equation_name, x_values, y_values, stats, names)
+            else:
+                n = int(input('Enter the number of iterations: '))
+                table_ode_system(f, equation_name, a, b, y0, n, method, names)
+        elif choice == '4':
+            while True:
+                dimension = input("\nEnter the dimension (2 or 3): ")
+                if dimension in ['2', '3']:
+                    dimension = int(dimension)
+                    break
+                else:
+                    print("Invalid choice. Please enter 2 or 3.")
+
+            variables = CUBATURE_VARIABLES.split()[:dimension]
+            from sympy import sympify
+            equation_name = input(f"Enter the function f({', '.join(variables)}): ")
+            try:
+                with stage('parse'):
+                    fn = sympify(equation_name)
+            except Exception as e:
+                print("Error defining the function: ", e)
+                exit()
+
+            f = counted('f', compile_cubature(fn, dimension))
+
+            lower = []
+            upper = []
+            for variable in variables:
+                while True:
+                    low = get_input(f"Enter the lower limit of {variable}: ")
+                    high = get_input(f"Enter the upper limit of {variable}: ")
+                    if np.isfinite(low) and np.isfinite(high):
+                        break
+                    else:
+                        print("Please enter finite limits: the region must be a box.")
+                lower.append(low)
+                upper.append(high)
+
+            while True:
+                print("\nSelect a method to approximate the integral:")
+                for i, method in enumerate(CUBATURE_TITLES, start=1):
+                    print(f"{i}. {CUBATURE_TITLES[method]}")
+                print(f"{len(CUBATURE_TITLES) + 1}. All cubature methods")
+
+                choice2 = input("Enter your choice: ")
+
+                if choice2 in [str(i) for i in range(1, len(CUBATURE_TITLES) + 2)]:
+                    break
+                else:
+                    print("Invalid choice. Please enter a valid option.")
+
+            if choice2 == str(len(CUBATURE_TITLES) + 1):
+                methods = list(CUBATURE_TITLES)
+            else:
+                methods = [list(CUBATURE_TITLES)[int(choice2) - 1]]
+
+            n = level = tol = None
+            while {'tensor_trapezoidal', 'tensor_simpson'} & set(methods):
+                try:
+                    n = int(input("Enter the number of sub-intervals per axis n (even number): "))
+                    if n % 2 == 0 and n > 0:
+                        break
+                    else:
+                        print("Please enter a positive even number of sub-intervals.")
+                except ValueError:
+                    print("Please enter a valid integer for the number of sub-intervals.")
+            while 'sparse_grid' in methods:
+                try:
+                    level = int(input("Enter the sparse grid level (e.g., 6): "))
+                    if level > 0:
+                        break
+                    else:
+                        print("Please enter a positive level.")
+                except ValueError:
+                    print("Please enter a valid integer for the level.")
+            while 'quasi_monte_carlo' in methods:
+                try:
+                    tol = float(input("Enter the tolerance (e.g., 1e-6): "))
+                    if tol > 0:
+                        break
+                    else:
+                        print("Please enter a positive tolerance.")
+                except ValueError:
+                    print("Please enter a valid number for the tolerance.")
+
+            table_cubature(lower, upper, f, methods, n, level, tol)
+        elif choice == '5':
             print("Exiting program...")
             break
         else:
@@ -736,4 +1479,9 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    if os.environ.get('PROFILE'):
+        with profiling() as report:
+            main()
+        print_report(report.as_dict())
+    else:
+        main()